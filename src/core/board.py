@@ -0,0 +1,1138 @@
+# ---------IMPORTS---------
+import asyncio
+import json
+import math
+import sys
+import time
+
+
+# Archive actions read per request when looking for archived cards
+ARCHIVE_PAGE = 100
+
+# Fetches of the board per refresh, when tools keep writing while it is fetched
+REFRESH_ATTEMPTS = 3
+
+
+# ---------NAME INDEX----------
+class AmbiguousNameError(LookupError):
+    """Raised when a name lookup matches several objects of the board"""
+
+
+class UnknownNameError(LookupError):
+    """Raised when a name lookup matches no object of the board.
+
+    Carries the closest names of the board, so a typo can be corrected without
+    listing the whole board again.
+    """
+
+    def __init__(self, kind: str, name: str, candidates: list):
+        """Initialise error
+
+        Args:
+            kind (str): kind of object looked up, e.g. "card"
+            name (str): name looked up
+            candidates (list): (name, score) pairs of the closest names, best first
+        """
+        self.candidates = candidates
+        message = f"No {kind} is named '{name}'."
+        if candidates:
+            names = " or ".join(f"'{candidate}'" for candidate, _ in candidates)
+            message += f" Did you mean {names}?"
+        super().__init__(message)
+
+
+class NameIndex:
+    """Index from casefolded name to the IDs of the objects bearing that name.
+
+    Each name maps to a bucket of IDs so that duplicate names are kept rather than
+    overwritten. Buckets keep insertion order, which keeps lookups deterministic.
+
+    Names are also indexed by trigram, so the closest names to a misspelt one can
+    be found without comparing it to every name of the board.
+    """
+
+    def __init__(self):
+        """Initialise empty index"""
+        self._buckets: dict[str, dict[str, None]] = {}
+
+        # Spelling each name was first indexed with, and its trigrams
+        self._names: dict[str, str] = {}
+        self._trigrams: dict[str, frozenset] = {}
+
+        # Names bearing each trigram
+        self._postings: dict[str, dict[str, None]] = {}
+
+    @staticmethod
+    def key(name: str) -> str:
+        """Normalises a name for lookups
+
+        Args:
+            name (str): name to normalise
+
+        Returns:
+            str: casefolded name
+        """
+        return name.casefold()
+
+    @staticmethod
+    def trigrams(key: str) -> frozenset:
+        """Splits a normalised name into trigrams
+
+        Each word is padded so that its first and last letters weigh as much as
+        the others, as in PostgreSQL's pg_trgm.
+
+        Args:
+            key (str): normalised name
+
+        Returns:
+            frozenset: trigrams of the name
+        """
+        grams = set()
+        for word in key.split():
+            padded = f"  {word} "
+            grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+        return frozenset(grams)
+
+    def clear(self):
+        """Empties the index"""
+        self._buckets.clear()
+        self._names.clear()
+        self._trigrams.clear()
+        self._postings.clear()
+
+    def add(self, object_id: str, name: str):
+        """Adds an object to the bucket of its name
+
+        Args:
+            object_id (str): ID of the object
+            name (str): name of the object
+        """
+        key = self.key(name)
+        if key not in self._buckets:
+            self._buckets[key] = {}
+            self._names[key] = name
+            self._trigrams[key] = self.trigrams(key)
+            for gram in self._trigrams[key]:
+                self._postings.setdefault(gram, {})[key] = None
+        self._buckets[key][object_id] = None
+
+    def remove(self, object_id: str, name: str):
+        """Removes an object from the bucket of its name
+
+        Args:
+            object_id (str): ID of the object
+            name (str): name the object was indexed under
+        """
+        key = self.key(name)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return
+        bucket.pop(object_id, None)
+        if not bucket:
+            del self._buckets[key]
+            del self._names[key]
+            for gram in self._trigrams.pop(key):
+                postings = self._postings[gram]
+                del postings[key]
+                if not postings:
+                    del self._postings[gram]
+
+    def get(self, name: str) -> list:
+        """Returns the IDs of the objects bearing a name
+
+        Args:
+            name (str): name to look up
+
+        Returns:
+            list: IDs in insertion order, empty if the name is unknown
+        """
+        return list(self._buckets.get(self.key(name), ()))
+
+    def suggest(self, name: str, limit: int = 3, threshold: float = 0.3) -> list:
+        """Returns the indexed names closest to a name
+
+        Closeness is the Dice similarity of trigram sets. A name reaching the
+        threshold shares a minimum number of trigrams with the looked up name, so
+        it must bear one of its rarest trigrams: only names found in their postings
+        are scored.
+
+        Args:
+            name (str): name to look up, usually misspelt
+            limit (int, optional): maximum number of names to return. Defaults to 3.
+            threshold (float, optional): minimum similarity, from 0 to 1. Defaults to 0.3.
+
+        Returns:
+            list: (name, score) pairs, best first
+        """
+        grams = self.trigrams(self.key(name))
+        if not grams:
+            return []
+        needed = max(1, math.ceil(threshold * len(grams) / (2 - threshold)))
+        rarest = sorted(grams, key=lambda gram: len(self._postings.get(gram, ())))
+        candidates = set()
+        for gram in rarest[: len(grams) - needed + 1]:
+            candidates.update(self._postings.get(gram, ()))
+
+        scored = []
+        for key in candidates:
+            other = self._trigrams[key]
+            score = 2 * len(grams & other) / (len(grams) + len(other))
+            if score >= threshold:
+                scored.append((self._names[key], round(score, 2)))
+        # Ties are broken by name so suggestions are stable across runs
+        scored.sort(key=lambda candidate: (-candidate[1], candidate[0]))
+        return scored[:limit]
+
+
+# ---------BOARD CACHE----------
+class BoardCache:
+    """In-memory snapshot of a Trello board (lists, open cards, labels and members).
+
+    The snapshot is refetched once it is older than its TTL. Mutating tools write
+    their Trello responses through to the snapshot so it stays current in between.
+
+    With a store, every fetched snapshot is also saved to disk, so a restarted
+    server can serve its first tool calls from the last snapshot, and open cards
+    are mirrored in the store's full-text index as they change.
+    """
+
+    def __init__(self, client, transport, board_id: str, ttl: float = 30.0, store=None):
+        """Initialise board cache
+
+        Args:
+            client (TrelloClient): client used to fetch the board
+            transport (TrelloTransport): transport whose thread pool runs the fetches
+            board_id (str): ID of the board to mirror
+            ttl (float, optional): seconds before the snapshot is refetched. Defaults to 30.0.
+            store (BoardStore | None, optional): on-disk store of the snapshot. Defaults to None (memory only).
+        """
+        self.client = client
+        self.transport = transport
+        self.board_id = board_id
+        self.ttl = ttl
+        self.store = store
+
+        # Raw Trello JSON objects keyed by ID
+        self._lists: dict[str, dict] = {}
+        self._cards: dict[str, dict] = {}
+        self._labels: dict[str, dict] = {}
+        self._members: dict[str, dict] = {}
+
+        # Open card IDs grouped by list ID, and by ID of the labels they bear
+        self._cards_by_list: dict[str, dict[str, None]] = {}
+        self._cards_by_label: dict[str, dict[str, None]] = {}
+
+        # Name indexes over the objects above
+        self._list_names = NameIndex()
+        self._card_names = NameIndex()
+        self._label_names = NameIndex()
+
+        # Archived cards read so far from the board's archive actions, newest first,
+        # from its closed cards, or written through. They only carry a few fields.
+        self._archived: dict[str, dict] = {}
+        self._archived_names = NameIndex()
+
+        # Cards whose latest archive or restore is known
+        self._archive_known: set[str] = set()
+
+        # Date of the newest archive action read, and whether every archived card
+        # of the board was read
+        self._archive_newest: str | None = None
+        self._archive_complete = False
+
+        # Monotonic time of last refresh, None if never fetched
+        self._fetched_at: float | None = None
+
+        # Trello's dateLastActivity of the board when the snapshot was taken, moved
+        # forward by the cards written through since
+        self._date_last_activity: str | None = None
+
+        # Concurrent tool calls share a single in-flight refresh
+        self._refresh_lock = asyncio.Lock()
+
+        # Bumped by every write-through, so a refresh can tell whether the board it
+        # fetched predates a write
+        self._generation = 0
+
+    # ---------FRESHNESS----------
+    def is_stale(self) -> bool:
+        """Checks whether the snapshot needs to be refetched
+
+        Returns:
+            bool: True if the snapshot was never fetched or is older than the TTL
+        """
+        if self._fetched_at is None:
+            return True
+        return time.monotonic() - self._fetched_at > self.ttl
+
+    def invalidate(self):
+        """Marks the snapshot as stale so the next read refetches it"""
+        self._fetched_at = None
+
+    async def refresh(self):
+        """Refetches lists, open cards, labels and members of the board
+
+        A board fetched while a tool wrote through to the snapshot may predate the
+        write, so it is fetched again. After REFRESH_ATTEMPTS such races, the
+        current snapshot is kept as is.
+        """
+        for _ in range(REFRESH_ATTEMPTS):
+            generation = self._generation
+            board, encoded = await self.transport.run(self._fetch)
+            if generation == self._generation:
+                break
+        else:
+            return
+        self._apply(board)
+        if self.store is not None:
+            await self.store.save(self.board_id, board["dateLastActivity"], encoded)
+
+    def _fetch(self) -> tuple:
+        """Fetches the board in a single request (blocking, run in the transport's thread pool)
+
+        The board is encoded for the store here, before the event loop starts
+        mutating it.
+
+        Returns:
+            tuple: raw board with its lists, open cards, labels and members, and its JSON
+        """
+        board = self.client.fetch_json(
+            f"/boards/{self.board_id}",
+            query_params={
+                "fields": "name,dateLastActivity",
+                "lists": "open",
+                "cards": "open",
+                "labels": "all",
+                "labels_limit": 1000,
+                "members": "all",
+            },
+        )
+        return board, json.dumps(board) if self.store is not None else None
+
+    def _apply(self, board: dict):
+        """Replaces the snapshot with a fetched or stored board
+
+        Args:
+            board (dict): raw board with its lists, open cards, labels and members
+        """
+        cards = board["cards"]
+        self._lists = {trello_list["id"]: trello_list for trello_list in board["lists"]}
+        self._cards = {card["id"]: card for card in cards}
+        self._labels = {label["id"]: label for label in board["labels"]}
+        self._members = {member["id"]: member for member in board["members"]}
+        self._date_last_activity = board["dateLastActivity"]
+        self._fetched_at = time.monotonic()
+
+        self._cards_by_list = {list_id: {} for list_id in self._lists}
+        self._cards_by_label = {}
+        for card in cards:
+            self._cards_by_list.setdefault(card["idList"], {})[card["id"]] = None
+            self._label_card(card["id"], card["idLabels"])
+
+        self._rebuild_index(self._list_names, self._lists)
+        self._rebuild_index(self._card_names, self._cards)
+        self._rebuild_index(self._label_names, self._labels)
+        if self.store is not None:
+            self.store.submit(self.store.index_board, self.board_id, cards)
+
+    async def load_snapshot(self) -> bool:
+        """Loads the snapshot saved by a previous session, if any
+
+        The loaded snapshot counts as fresh for one TTL. Call revalidate() to check
+        it against Trello in the background.
+
+        Returns:
+            bool: True if a snapshot was loaded
+        """
+        if self.store is None:
+            return False
+        try:
+            row = await self.store.load(self.board_id)
+        except Exception as e:
+            # A corrupt or unreadable file only costs a cold start
+            print(f"Error: could not load board snapshot: {e}", file=sys.stderr)
+            return False
+        if row is None:
+            return False
+        self._apply(json.loads(row[1]))
+        return True
+
+    async def revalidate(self):
+        """Refetches the snapshot if the board changed since it was taken
+
+        Costs a single request for the board's dateLastActivity when it did not,
+        and the snapshot then counts as fresh for another TTL. Activity no later than
+        the newest card written through is the tools' own, so it is not a change.
+        """
+        try:
+            board = await self.transport.run(
+                self.client.fetch_json,
+                f"/boards/{self.board_id}",
+                query_params={"fields": "dateLastActivity"},
+            )
+            if (
+                self._date_last_activity is not None
+                and board["dateLastActivity"] <= self._date_last_activity
+            ):
+                self._fetched_at = time.monotonic()
+                return
+            async with self._refresh_lock:
+                await self.refresh()
+        except Exception as e:
+            # Keep serving the snapshot, the TTL will refetch it later
+            print(f"Error: could not revalidate board snapshot: {e}", file=sys.stderr)
+
+    async def warm(self):
+        """Brings the snapshot up to date ahead of tool calls, e.g. while the LLM thinks
+
+        A stale snapshot is refetched, a fresh one is revalidated. Nothing is done
+        when webhook deltas keep the snapshot current (infinite TTL).
+        """
+        if self.is_stale():
+            await self.ensure_fresh()
+        elif self.ttl != math.inf:
+            await self.revalidate()
+
+    async def ensure_fresh(self):
+        """Refreshes the snapshot if it is stale"""
+        if not self.is_stale():
+            return
+        async with self._refresh_lock:
+            # Another call may have refreshed while we waited for the lock
+            if self.is_stale():
+                await self.refresh()
+
+    @staticmethod
+    def _rebuild_index(index: NameIndex, objects: dict):
+        """Rebuilds a name index from scratch
+
+        Args:
+            index (NameIndex): index to rebuild
+            objects (dict): raw Trello objects keyed by ID
+        """
+        index.clear()
+        for object_id, trello_object in objects.items():
+            index.add(object_id, trello_object["name"])
+
+    # ---------READS----------
+    async def lists(self) -> list:
+        """Returns the open lists of the board in board order
+
+        Returns:
+            list: raw Trello list objects
+        """
+        await self.ensure_fresh()
+        return sorted(self._lists.values(), key=lambda trello_list: trello_list["pos"])
+
+    async def cards(self) -> list:
+        """Returns the open cards of the board, grouped by list in board order
+
+        Returns:
+            list: raw Trello card objects
+        """
+        result = []
+        for trello_list in await self.lists():
+            result.extend(await self.list_cards(trello_list["id"]))
+        return result
+
+    async def list_cards(self, list_id: str) -> list:
+        """Returns the open cards of a list in list order
+
+        Args:
+            list_id (str): ID of the list
+
+        Returns:
+            list: raw Trello card objects
+        """
+        await self.ensure_fresh()
+        return sorted(
+            (self._cards[card_id] for card_id in self._cards_by_list.get(list_id, ())),
+            key=lambda card: card["pos"],
+        )
+
+    async def labels(self) -> list:
+        """Returns the labels of the board
+
+        Returns:
+            list: raw Trello label objects
+        """
+        await self.ensure_fresh()
+        return list(self._labels.values())
+
+    async def members(self) -> list:
+        """Returns the members of the board
+
+        Returns:
+            list: raw Trello member objects
+        """
+        await self.ensure_fresh()
+        return list(self._members.values())
+
+    async def get_list(self, list_id: str) -> dict | None:
+        """Returns a list by ID
+
+        Args:
+            list_id (str): ID of the list
+
+        Returns:
+            dict | None: raw Trello list object, None if not open on the board
+        """
+        await self.ensure_fresh()
+        return self._lists.get(list_id)
+
+    async def get_card(self, card_id: str) -> dict | None:
+        """Returns an open card by ID
+
+        Args:
+            card_id (str): ID of the card
+
+        Returns:
+            dict | None: raw Trello card object, None if not open on the board
+        """
+        await self.ensure_fresh()
+        return self._cards.get(card_id)
+
+    # ---------NAME LOOKUPS----------
+    @staticmethod
+    def _only(matches: list, kind: str, name: str, index: NameIndex) -> dict:
+        """Returns the single match of a name lookup
+
+        Args:
+            matches (list): raw Trello objects bearing the name
+            kind (str): kind of object looked up, used in error messages
+            name (str): name looked up
+            index (NameIndex): index looked up, used to suggest close names
+
+        Raises:
+            AmbiguousNameError: several objects bear the name
+            UnknownNameError: no object bears the name
+
+        Returns:
+            dict: matching object
+        """
+        if not matches:
+            raise UnknownNameError(kind, name, index.suggest(name))
+        if len(matches) > 1:
+            ids = ", ".join(match["id"] for match in matches)
+            raise AmbiguousNameError(
+                f"{len(matches)} {kind}s are named '{name}' (IDs: {ids})."
+            )
+        return matches[0]
+
+    async def find_list(self, name: str) -> dict:
+        """Returns the open list bearing a name (case-insensitive)
+
+        Args:
+            name (str): name of the list
+
+        Raises:
+            AmbiguousNameError: several lists bear the name
+            UnknownNameError: no list bears the name
+
+        Returns:
+            dict: raw Trello list
+        """
+        await self.ensure_fresh()
+        matches = [self._lists[list_id] for list_id in self._list_names.get(name)]
+        return self._only(matches, "list", name, self._list_names)
+
+    async def find_card(self, name: str) -> dict:
+        """Returns the open card bearing a name (case-insensitive)
+
+        Args:
+            name (str): name of the card
+
+        Raises:
+            AmbiguousNameError: several cards bear the name
+            UnknownNameError: no open card bears the name
+
+        Returns:
+            dict: raw Trello card
+        """
+        await self.ensure_fresh()
+        matches = [self._cards[card_id] for card_id in self._card_names.get(name)]
+        if not matches:
+            raise UnknownNameError("open card", name, self._card_names.suggest(name))
+        if len(matches) > 1:
+            # Describe duplicates by list so the user can tell them apart
+            where = ", ".join(
+                f"{card['id']} in '{self._lists.get(card['idList'], {}).get('name', '?')}'"
+                for card in matches
+            )
+            raise AmbiguousNameError(
+                f"{len(matches)} cards are named '{name}' ({where})."
+            )
+        return matches[0]
+
+    async def find_label(self, name: str) -> dict:
+        """Returns the label bearing a name (case-insensitive)
+
+        Args:
+            name (str): name of the label
+
+        Raises:
+            AmbiguousNameError: several labels bear the name
+            UnknownNameError: no label bears the name
+
+        Returns:
+            dict: raw Trello label
+        """
+        await self.ensure_fresh()
+        matches = [self._labels[label_id] for label_id in self._label_names.get(name)]
+        return self._only(matches, "label", name, self._label_names)
+
+    async def find_archived_card(self, name: str) -> dict:
+        """Returns the most recently archived card bearing a name (case-insensitive)
+
+        If the name is not in the archive index, archive actions newer than the
+        index are read first, in case the card was archived outside of Dave. If it
+        is still missing, every archived card of the board is read in one request.
+        A lookup costs at most two requests, however long the archive.
+
+        Args:
+            name (str): name of the card
+
+        Raises:
+            UnknownNameError: no archived card bears the name
+
+        Returns:
+            dict: raw Trello card, or the id, name, idList and shortUrl of a card read from the archive actions
+        """
+        if not self._archived_names.get(name):
+            await self._read_newer_archive()
+        if not self._archived_names.get(name) and not self._archive_complete:
+            await self._read_closed_cards()
+        matches = [
+            self._archived[card_id] for card_id in self._archived_names.get(name)
+        ]
+        if not matches:
+            raise UnknownNameError(
+                "archived card", name, self._archived_names.suggest(name)
+            )
+        return max(matches, key=lambda card: card["dateLastActivity"])
+
+    # ---------ARCHIVE----------
+    async def _archive_actions(self, **params) -> list:
+        """Fetches archive and restore actions of the board, newest first
+
+        Args:
+            **params: paging parameters of the request (limit, before, since)
+
+        Returns:
+            list: raw updateCard actions whose card was archived or restored
+        """
+        return await self.transport.run(
+            self.client.fetch_json,
+            f"/boards/{self.board_id}/actions",
+            query_params={
+                "filter": "updateCard:closed",
+                "fields": "data,date",
+                "memberCreator": "false",
+                **params,
+            },
+        )
+
+    def _read_archive_actions(self, actions: list):
+        """Updates the archive index from archive and restore actions newer than it
+
+        Args:
+            actions (list): raw updateCard actions, newest first
+        """
+        seen = set()
+        for action in actions:
+            card = action["data"]["card"]
+            if card["id"] in seen:
+                continue
+            seen.add(card["id"])
+            self._archive_known.add(card["id"])
+
+            old = self._archived.pop(card["id"], None)
+            if old is not None:
+                self._archived_names.remove(card["id"], old["name"])
+            if card.get("closed"):
+                self._archived[card["id"]] = self._archived_card(action)
+                self._archived_names.add(card["id"], card["name"])
+
+        if actions:
+            self._archive_newest = actions[0]["date"]
+
+    @staticmethod
+    def _archived_card(action: dict) -> dict:
+        """Builds an archived card from the partial card sent in an archive action
+
+        Args:
+            action (dict): raw updateCard action
+
+        Returns:
+            dict: card with its id, name, list, link and archive date
+        """
+        card = action["data"]["card"]
+        return {
+            "id": card["id"],
+            "name": card["name"],
+            "idList": action["data"].get("list", {}).get("id"),
+            "closed": True,
+            "shortUrl": f"https://trello.com/c/{card.get('shortLink', '')}",
+            "dateLastActivity": action["date"],
+        }
+
+    async def _read_newer_archive(self):
+        """Reads the archive actions newer than the index"""
+        if self._archive_newest is None:
+            actions = await self._archive_actions(limit=ARCHIVE_PAGE)
+            self._archive_complete = len(actions) < ARCHIVE_PAGE
+            self._read_archive_actions(actions)
+            return
+
+        actions = await self._archive_actions(since=self._archive_newest, limit=1000)
+        if len(actions) == 1000:
+            # Too much happened to catch up, start the index over
+            self._archived.clear()
+            self._archived_names.clear()
+            self._archive_known.clear()
+            self._archive_newest = None
+            self._archive_complete = False
+            await self._read_newer_archive()
+        else:
+            self._read_archive_actions(actions)
+
+    async def _read_closed_cards(self):
+        """Reads every archived card of the board into the index, in one request
+
+        Cards whose latest archive or restore is already known keep their entry.
+        """
+        cards = await self.transport.run(
+            self.client.fetch_json,
+            f"/boards/{self.board_id}/cards/closed",
+            query_params={"fields": "name,closed,dateLastActivity,idList,shortUrl"},
+        )
+        for card in cards:
+            if card["id"] in self._archive_known:
+                continue
+            self._archive_known.add(card["id"])
+            self._archived[card["id"]] = card
+            self._archived_names.add(card["id"], card["name"])
+        self._archive_complete = True
+
+    async def archived_cards(self, limit: int, before: str | None = None) -> tuple:
+        """Returns archived cards, most recently archived first, a page at a time
+
+        Only the archive actions needed to fill the page are requested.
+
+        Args:
+            limit (int): maximum number of cards to return
+            before (str | None, optional): cursor returned with the previous page. Defaults to None (first page).
+
+        Returns:
+            tuple: cards (id, name, idList, shortUrl and archive date), and the cursor of the next page, None on the last page
+        """
+        # Trello returns at most 1000 actions per request
+        page = min(limit, 1000)
+        cards, reported, cursor = [], set(), before
+        while len(cards) < limit:
+            actions = await self._archive_actions(before=cursor, limit=page)
+            if cursor is None and self._archive_newest is None:
+                # The first page starts the archive index, later ones would leave
+                # a gap in it
+                self._read_archive_actions(actions)
+
+            for action in actions:
+                cursor = action["id"]
+                card = action["data"]["card"]
+                if card["id"] in reported or not card.get("closed"):
+                    reported.add(card["id"])
+                    continue
+                reported.add(card["id"])
+                latest = self._archived.get(card["id"])
+                # Skip cards restored since, or reported with a later archival
+                if card["id"] in self._archive_known and (
+                    latest is None or latest["dateLastActivity"] > action["date"]
+                ):
+                    continue
+                cards.append(self._archived_card(action))
+                if len(cards) == limit:
+                    break
+
+            # A short fetch read to its last action ends the archive
+            if len(actions) < page and (not actions or cursor == actions[-1]["id"]):
+                return cards, None
+        return cards, cursor
+
+    # ---------LABEL QUERIES----------
+    async def label_query(
+        self,
+        all_of: list | None = None,
+        any_of: list | None = None,
+        none_of: list | None = None,
+        list_id: str | None = None,
+    ) -> list:
+        """Returns the open cards matching a boolean query on their labels
+
+        Answered from the label index, without going through every card.
+
+        Args:
+            all_of (list | None, optional): IDs of labels the cards must all bear (AND). Defaults to None.
+            any_of (list | None, optional): IDs of labels the cards must bear at least one of (OR). Defaults to None.
+            none_of (list | None, optional): IDs of labels the cards must not bear (NOT). Defaults to None.
+            list_id (str | None, optional): only return cards of this list. Defaults to None.
+
+        Returns:
+            list: raw Trello cards in board order
+        """
+        await self.ensure_fresh()
+        constraints = [set(self._bearing(label_id)) for label_id in all_of or ()]
+        if any_of:
+            constraints.append(
+                set().union(*(self._bearing(label_id) for label_id in any_of))
+            )
+        if list_id is not None:
+            constraints.append(set(self._cards_by_list.get(list_id, ())))
+
+        if constraints:
+            # Intersecting from the smallest set keeps the work proportional to it
+            constraints.sort(key=len)
+            selected = constraints[0].intersection(*constraints[1:])
+        else:
+            selected = set(self._cards)
+        selected.difference_update(
+            *(self._bearing(label_id) for label_id in none_of or ())
+        )
+
+        return sorted(
+            (self._cards[card_id] for card_id in selected),
+            key=lambda card: (
+                self._lists.get(card["idList"], {}).get("pos", math.inf),
+                card["pos"],
+            ),
+        )
+
+    def _bearing(self, label_id: str):
+        """Returns the IDs of the open cards bearing a label
+
+        Args:
+            label_id (str): ID of the label
+
+        Returns:
+            KeysView: card IDs
+        """
+        return self._cards_by_label.get(label_id, {}).keys()
+
+    # ---------SEARCH----------
+    async def search(self, query: str, limit: int = 10) -> list:
+        """Searches open cards by name, description and label names, best match first
+
+        Args:
+            query (str): words to look for
+            limit (int, optional): maximum number of cards to return. Defaults to 10.
+
+        Returns:
+            list: (card, description snippet) pairs of raw Trello cards
+        """
+        await self.ensure_fresh()
+        rows = await self.store.search(self.board_id, query, limit)
+        # Skip cards dropped from the snapshot since the search was queued
+        return [
+            (self._cards[card_id], snippet)
+            for card_id, snippet in rows
+            if card_id in self._cards
+        ]
+
+    # ---------WRITE-THROUGH----------
+    def put_list(self, trello_list: dict):
+        """Stores a list returned by Trello, dropping it if it was archived
+
+        Args:
+            trello_list (dict): raw Trello list object
+        """
+        self._generation += 1
+        old = self._lists.pop(trello_list["id"], None)
+        if old is not None:
+            self._list_names.remove(old["id"], old["name"])
+        if not trello_list.get("closed"):
+            self._lists[trello_list["id"]] = trello_list
+            self._list_names.add(trello_list["id"], trello_list["name"])
+
+    def put_card(self, card: dict):
+        """Stores a card returned by Trello, dropping it if it was archived
+
+        Args:
+            card (dict): raw Trello card object
+        """
+        self.drop_card(card["id"])
+        self._archive_known.add(card["id"])
+        date = card.get("dateLastActivity")
+        if (
+            self._date_last_activity is not None
+            and date
+            and date > self._date_last_activity
+        ):
+            self._date_last_activity = date
+        if card.get("closed"):
+            self._archived[card["id"]] = card
+            self._archived_names.add(card["id"], card["name"])
+        else:
+            self._cards[card["id"]] = card
+            self._cards_by_list.setdefault(card["idList"], {})[card["id"]] = None
+            self._card_names.add(card["id"], card["name"])
+            self._label_card(card["id"], card["idLabels"])
+            self._index_card(card)
+
+    def drop_card(self, card_id: str):
+        """Removes a card from the open and archived cards of the snapshot
+
+        Args:
+            card_id (str): ID of the card
+        """
+        self._generation += 1
+        old = self._cards.pop(card_id, None)
+        if old is not None:
+            self._cards_by_list.get(old["idList"], {}).pop(card_id, None)
+            self._card_names.remove(card_id, old["name"])
+            self._unlabel_card(card_id, old["idLabels"])
+            if self.store is not None:
+                self.store.submit(self.store.unindex_card, card_id)
+        old = self._archived.pop(card_id, None)
+        if old is not None:
+            self._archived_names.remove(card_id, old["name"])
+
+    def set_card_labels(self, card_id: str, label_ids: list):
+        """Updates the labels of a cached card
+
+        Args:
+            card_id (str): ID of the card
+            label_ids (list): IDs of the labels now on the card
+        """
+        self._generation += 1
+        card = self._cards.get(card_id)
+        if card is None:
+            return
+        self._unlabel_card(card_id, card["idLabels"])
+        card["idLabels"] = list(label_ids)
+        card["labels"] = [
+            self._labels[label_id] for label_id in label_ids if label_id in self._labels
+        ]
+        self._label_card(card_id, card["idLabels"])
+        self._index_card(card)
+
+    def _label_card(self, card_id: str, label_ids: list):
+        """Adds an open card to the label index
+
+        Args:
+            card_id (str): ID of the card
+            label_ids (list): IDs of the labels it bears
+        """
+        for label_id in label_ids:
+            self._cards_by_label.setdefault(label_id, {})[card_id] = None
+
+    def _unlabel_card(self, card_id: str, label_ids: list):
+        """Removes a card from the label index
+
+        Args:
+            card_id (str): ID of the card
+            label_ids (list): IDs of the labels it was indexed under
+        """
+        for label_id in label_ids:
+            bearing = self._cards_by_label.get(label_id)
+            if bearing is not None:
+                bearing.pop(card_id, None)
+                if not bearing:
+                    del self._cards_by_label[label_id]
+
+    def _index_card(self, card: dict):
+        """Queues an open card for the store's full-text index
+
+        Args:
+            card (dict): raw Trello card object
+        """
+        if self.store is not None:
+            self.store.submit(self.store.index_card, self.board_id, card)
+
+    def put_label(self, label: dict):
+        """Stores a label and refreshes its copies embedded in cached cards
+
+        Args:
+            label (dict): raw Trello label object
+        """
+        self._generation += 1
+        old = self._labels.pop(label["id"], None)
+        if old is not None:
+            self._label_names.remove(label["id"], old["name"])
+        self._labels[label["id"]] = label
+        self._label_names.add(label["id"], label["name"])
+        for card_id in list(self._bearing(label["id"])):
+            self.set_card_labels(card_id, self._cards[card_id]["idLabels"])
+
+    def drop_label(self, label_id: str):
+        """Removes a label from the board and from the cached cards bearing it
+
+        Args:
+            label_id (str): ID of the label
+        """
+        self._generation += 1
+        old = self._labels.pop(label_id, None)
+        if old is not None:
+            self._label_names.remove(label_id, old["name"])
+        for card_id in list(self._bearing(label_id)):
+            self.set_card_labels(
+                card_id,
+                [
+                    other
+                    for other in self._cards[card_id]["idLabels"]
+                    if other != label_id
+                ],
+            )
+
+    # ---------WEBHOOK DELTAS----------
+    def apply_action(self, action: dict):
+        """Applies a Trello webhook action to the snapshot as a delta
+
+        Actions that cannot be applied as a delta mark the snapshot as stale, so the
+        next read refetches it. Actions that do not touch cached fields are ignored.
+
+        Args:
+            action (dict): "action" object of a Trello webhook payload
+        """
+        handler = ACTION_HANDLERS.get(action["type"])
+        if handler is not None:
+            handler(self, action["data"], action.get("date", ""))
+        elif action["type"] not in IGNORED_ACTIONS:
+            self.invalidate()
+
+    def _card_from_action(self, data: dict, date: str) -> dict:
+        """Builds a raw card from the partial card sent in an action
+
+        Args:
+            data (dict): "data" object of the action
+            date (str): date of the action
+
+        Returns:
+            dict: cached card updated with the action's fields, or a new raw card
+        """
+        partial = data["card"]
+        card = self._cards.get(partial["id"])
+        if card is None:
+            trello_list = data.get("listAfter") or data.get("list") or {}
+            siblings = self._cards_by_list.get(trello_list.get("id"), {})
+            card = {
+                "id": partial["id"],
+                "name": partial.get("name", ""),
+                "desc": "",
+                "idList": trello_list.get("id"),
+                # Unknown position, append after the last card of the list
+                "pos": max(
+                    (self._cards[card_id]["pos"] for card_id in siblings), default=0
+                )
+                + 65536,
+                "closed": False,
+                "idLabels": [],
+                "labels": [],
+                "shortUrl": f"https://trello.com/c/{partial.get('shortLink', '')}",
+            }
+            # Archived cards read from archive actions only carry a few fields
+            card.update(self._archived.get(partial["id"], {}))
+        card = dict(card)
+        for key, value in partial.items():
+            if key in card or key in data.get("old", {}):
+                card[key] = value
+        card["dateLastActivity"] = date
+        return card
+
+    def _on_card_created(self, data: dict, date: str):
+        """Handles createCard actions"""
+        self.put_card(self._card_from_action(data, date))
+
+    def _on_card_updated(self, data: dict, date: str):
+        """Handles updateCard actions
+
+        A card missing from the snapshot may have been archived long ago. Unless
+        the action says whether it is archived, the snapshot is marked as stale
+        rather than assuming the card is open.
+        """
+        card_id = data["card"]["id"]
+        if (
+            card_id not in self._cards
+            and card_id not in self._archived
+            and "closed" not in data["card"]
+        ):
+            self.invalidate()
+            return
+        self.put_card(self._card_from_action(data, date))
+
+    def _on_card_deleted(self, data: dict, date: str):
+        """Handles deleteCard actions"""
+        self.drop_card(data["card"]["id"])
+
+    def _on_card_label_added(self, data: dict, date: str):
+        """Handles addLabelToCard actions"""
+        if data["label"]["id"] not in self._labels:
+            self.put_label(data["label"])
+        card = self._cards.get(data["card"]["id"])
+        if card is not None and data["label"]["id"] not in card["idLabels"]:
+            self.set_card_labels(card["id"], card["idLabels"] + [data["label"]["id"]])
+
+    def _on_card_label_removed(self, data: dict, date: str):
+        """Handles removeLabelFromCard actions"""
+        card = self._cards.get(data["card"]["id"])
+        if card is not None:
+            self.set_card_labels(
+                card["id"],
+                [
+                    label_id
+                    for label_id in card["idLabels"]
+                    if label_id != data["label"]["id"]
+                ],
+            )
+
+    def _on_list_changed(self, data: dict, date: str):
+        """Handles createList and updateList actions"""
+        partial = data["list"]
+        trello_list = dict(
+            self._lists.get(partial["id"])
+            or {"id": partial["id"], "name": "", "pos": 0, "closed": False}
+        )
+        trello_list.update(partial)
+        self.put_list(trello_list)
+
+    def _on_label_changed(self, data: dict, date: str):
+        """Handles createLabel and updateLabel actions"""
+        label = dict(self._labels.get(data["label"]["id"], {}))
+        label.update(data["label"])
+        self.put_label(label)
+
+    def _on_label_deleted(self, data: dict, date: str):
+        """Handles deleteLabel actions"""
+        self.drop_label(data["label"]["id"])
+
+
+# Webhook action types applied as deltas
+ACTION_HANDLERS = {
+    "createCard": BoardCache._on_card_created,
+    "updateCard": BoardCache._on_card_updated,
+    "deleteCard": BoardCache._on_card_deleted,
+    "addLabelToCard": BoardCache._on_card_label_added,
+    "removeLabelFromCard": BoardCache._on_card_label_removed,
+    "createList": BoardCache._on_list_changed,
+    "updateList": BoardCache._on_list_changed,
+    "createLabel": BoardCache._on_label_changed,
+    "updateLabel": BoardCache._on_label_changed,
+    "deleteLabel": BoardCache._on_label_deleted,
+}
+
+# Webhook action types that do not touch cached fields
+IGNORED_ACTIONS = {
+    "commentCard",
+    "updateComment",
+    "deleteComment",
+    "addAttachmentToCard",
+    "deleteAttachmentFromCard",
+    "addChecklistToCard",
+    "removeChecklistFromCard",
+    "updateChecklist",
+    "createCheckItem",
+    "updateCheckItem",
+    "updateCheckItemStateOnCard",
+    "deleteCheckItem",
+    "addMemberToCard",
+    "removeMemberFromCard",
+    "updateCustomFieldItem",
+}
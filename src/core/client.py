@@ -1,12 +1,13 @@
 # -----------IMPORTS-----------
+import asyncio
 import os
-from openai import AzureOpenAI
 import json
-from mcp import ClientSession
+from mcp import ClientSession, types
 
 from dotenv import load_dotenv
 
 from gui.window import ChatWindow
+from core.memory import Conversation
 
 
 # ----------INITIALIZATION-----------
@@ -29,6 +30,11 @@ Your tone is concise, helpful, and professional. When responding:
 - Always prioritize clarity and brevity.
 """
 
+# Closes a cancelled turn in the conversation, after the tool calls it made
+CANCELLED_REPLY = (
+    "The user cancelled this request. The tool calls above were made before it stopped."
+)
+
 
 # ----------CLIENT CLASS-----------
 class MCPClient:
@@ -41,16 +47,135 @@ class MCPClient:
             exit_stack (ASyncStack): session manager for async context
         """
         self.session: ClientSession | None = None
+        # Resolved once the session is initialised, queries sent before wait for it
+        self.connected: asyncio.Future[None] = asyncio.Future()
         # Session manager
         self.exit_stack = exit_stack
-        # gpt-4o model
-        self.azure = AzureOpenAI(
-            api_version="2024-12-01-preview",
-            azure_endpoint="https://exp-graphrag.openai.azure.com/",
-            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        )
+        # gpt-4o model, created on first use (see azure)
+        self._azure = None
         # GUI window
         self.window: ChatWindow | None = None
+        # History of previous turns, bounded by a token budget
+        self.conversation = Conversation(
+            token_budget=int(os.getenv("CONVERSATION_TOKEN_BUDGET", "8000"))
+        )
+        # Longest tool result fed back to the LLM, in characters
+        self.max_tool_result = int(os.getenv("MAX_TOOL_RESULT_CHARS", "20000"))
+        # Tool registry keyed by tool name, reloaded on tools/list_changed
+        self.tools: dict[str, dict] = {}
+        self.tools_stale = True
+        # Board prefetch running alongside the first completion of a query
+        self.prefetch_task: asyncio.Task | None = None
+
+    @property
+    def azure(self):
+        """Async Azure OpenAI client, completions never block the Qt loop
+
+        openai is only imported here, so it does not delay startup.
+
+        Returns:
+            AsyncAzureOpenAI: client of the gpt-4o model
+        """
+        if self._azure is None:
+            from openai import AsyncAzureOpenAI
+
+            self._azure = AsyncAzureOpenAI(
+                api_version="2024-12-01-preview",
+                azure_endpoint="https://exp-graphrag.openai.azure.com/",
+                api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            )
+        return self._azure
+
+    async def load_tools(self) -> dict:
+        """Fetches the server's tools and rebuilds the tool registry
+
+        Returns:
+            dict: registry entries keyed by tool name, each with the tool's OpenAI schema and consent/prompt flags
+        """
+        response = await self.session.list_tools()
+        self.tools = {
+            tool.name: {
+                "description": tool.description,
+                # Does the tool need consent?
+                "needs_consent": "[consent]" in tool.description.lower(),
+                # Is the tool a prompt?
+                "is_prompt": "[prompt]" in tool.description.lower(),
+                # Is the tool called by the client only, never offered to the LLM?
+                "is_internal": "[internal]" in tool.description.lower(),
+                "schema": {
+                    "type": "function",
+                    "function": {
+                        "name": tool.name,
+                        "description": tool.description,
+                        "parameters": tool.inputSchema,
+                    },
+                },
+            }
+            for tool in response.tools
+        }
+        self.tools_stale = False
+        return self.tools
+
+    async def get_tools(self) -> dict:
+        """Returns the tool registry, reloading it if the server changed its tools
+
+        Returns:
+            dict: registry entries keyed by tool name
+        """
+        if self.tools_stale:
+            await self.load_tools()
+        return self.tools
+
+    def tool_result_text(self, result) -> str:
+        """Extracts the text of a tool result, truncating oversized results
+
+        Args:
+            result (CallToolResult): result returned by the MCP server
+
+        Returns:
+            str: text fed back to the LLM
+        """
+        text = "\n".join(
+            content.text for content in result.content if content.type == "text"
+        )
+        if len(text) <= self.max_tool_result:
+            return text
+        dropped = len(text) - self.max_tool_result
+        return (
+            text[: self.max_tool_result]
+            + f"... [{dropped} characters truncated. Call the tool again with fields, contains, offset or limit to narrow the result.]"
+        )
+
+    async def handle_message(self, message):
+        """Handles incoming server messages, used as the session's message_handler
+
+        Args:
+            message (RequestResponder | ServerNotification | Exception): message sent by the server
+        """
+        if isinstance(message, types.ServerNotification) and isinstance(
+            message.root, types.ToolListChangedNotification
+        ):
+            self.tools_stale = True
+
+    def prefetch(self):
+        """Asks the server to bring its board snapshot up to date in the background
+
+        Called when a query is submitted, so the refresh overlaps the first LLM
+        completion instead of delaying the first tool call.
+        """
+        if "warm_cache" not in self.tools:
+            return
+        if self.prefetch_task is not None and not self.prefetch_task.done():
+            return
+
+        async def warm_cache():
+            try:
+                await self.session.call_tool("warm_cache", {})
+            except Exception as e:
+                # Only an optimisation, tool calls refresh the board themselves
+                print(f"Error: prefetch failed: {e}")
+
+        self.prefetch_task = asyncio.create_task(warm_cache())
 
     async def process_query(self, query: str) -> str:
         """Processes a query (one turn)
@@ -61,125 +186,218 @@ class MCPClient:
         Returns:
             str: result reprocessed by LLM
         """
+        chunks = [chunk async for chunk in self.stream_query(query)]
+        return "".join(chunks).rstrip("\n")
 
-        # Initialise message history with system prompt and user query
-        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-        messages.append({"role": "user", "content": query})
+    async def stream_completion(self, messages: list, tools: list, calls: dict):
+        """Streams one LLM completion, yielding text deltas as they arrive
 
-        # Format tools
-        response = await self.session.list_tools()
-        available_tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": tool.name,
-                    "description": tool.description,
-                    "parameters": tool.inputSchema,
-                },
-            }
-            for tool in response.tools
-        ]
+        Args:
+            messages (list): message history to feed the LLM
+            tools (list): tools available to the LLM
+            calls (dict): filled with the tool calls assembled from the deltas, by index
 
-        # Feed system prompt, query and tools to LLM
-        response = self.azure.chat.completions.create(
+        Yields:
+            str: text delta of the completion
+        """
+        stream = await self.azure.chat.completions.create(
             messages=messages,
             tool_choice="auto",
-            tools=available_tools,
+            tools=tools,
             max_tokens=1000,
             model="gpt-4o",
+            stream=True,
         )
+        async for chunk in stream:
+            # Azure sends content filter results in chunks without choices
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+
+            if delta.content:
+                yield delta.content
+
+            # Tool calls arrive in fragments, assemble them by index
+            for fragment in delta.tool_calls or []:
+                call = calls.setdefault(
+                    fragment.index, {"id": "", "name": "", "arguments": ""}
+                )
+                if fragment.id:
+                    call["id"] = fragment.id
+                if fragment.function and fragment.function.name:
+                    call["name"] += fragment.function.name
+                if fragment.function and fragment.function.arguments:
+                    call["arguments"] += fragment.function.arguments
+
+    async def stream_query(self, query: str, progress=None):
+        """Processes a query (one turn), yielding the reply as it is generated
+
+        Args:
+            query (str): user query to process
+            progress (callable, optional): called with what the query is doing, e.g. "thinking". Defaults to None.
+
+        Yields:
+            str: tool call logs and text deltas of the LLM reply
+        """
+
+        # Queries typed while the server starts wait for the session
+        progress = progress or (lambda status: None)
+        if not self.connected.done():
+            progress("connecting")
+        await asyncio.shield(self.connected)
+
+        # Initialise message history with system prompt, previous turns and user query
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        messages.extend(self.conversation.messages())
+        turn_start = len(messages)
+        messages.append({"role": "user", "content": query})
+
+        # Format tools
+        tools = await self.get_tools()
+        available_tools = [
+            tool["schema"] for tool in tools.values() if not tool["is_internal"]
+        ]
+
+        # Refresh the board while the LLM works on its first completion
+        self.prefetch()
 
-        tool_results = []
-        final_text = []
+        try:
+            async for text in self.run_turn(
+                messages, turn_start, tools, available_tools, progress
+            ):
+                yield text
+        except asyncio.CancelledError:
+            # Tools already called may have changed the board, follow-up queries
+            # must know about them
+            if any(message["role"] == "tool" for message in messages[turn_start:]):
+                messages.append({"role": "assistant", "content": CANCELLED_REPLY})
+                self.conversation.commit(messages[turn_start:])
+            raise
 
+    async def run_turn(
+        self,
+        messages: list,
+        turn_start: int,
+        tools: dict,
+        available_tools: list,
+        progress,
+    ):
+        """Runs the completions and tool calls of a query, yielding the reply
+
+        Cancelling the query while its tools run lets them finish, since they
+        cannot be called back once sent. Their calls are logged and kept in
+        messages before the cancellation goes on.
+
+        Args:
+            messages (list): message history of the turn, extended as it goes
+            turn_start (int): index of the user query in messages
+            tools (dict): tool registry
+            available_tools (list): tool schemas offered to the LLM
+            progress (callable): called with what the query is doing
+
+        Yields:
+            str: tool call logs and text deltas of the LLM reply
+        """
         # While LLM calls tools
         while True:
-            # Collect latest message
-            message = response.choices[0].message
-
-            # Process potential tool call
-            if message.tool_calls:
-                for call in message.tool_calls:
-                    # Load tool
-                    tool_name = call.function.name
-                    tool_args = json.loads(call.function.arguments)
-                    tool_desc = "".join(
+            # Feed message history and tools to LLM, streaming its reply
+            calls = {}
+            reply = []
+            progress("thinking")
+            async for text in self.stream_completion(messages, available_tools, calls):
+                if not reply:
+                    progress("answering")
+                reply.append(text)
+                yield text
+
+            # No tool call (end of turn), remember it for follow-up queries
+            if not calls:
+                messages.append({"role": "assistant", "content": "".join(reply)})
+                self.conversation.commit(messages[turn_start:])
+                break
+
+            # Load tool calls and ask for consent up front
+            pending = []
+            for index in sorted(calls):
+                call = calls[index]
+
+                # Load tool
+                tool_name = call["name"]
+                tool_args = json.loads(call["arguments"] or "{}")
+                tool = tools.get(tool_name, {})
+                tool_desc = tool.get("description", "")
+                is_prompt = tool.get("is_prompt", False)
+
+                # Ask user for consent
+                if not tool.get("needs_consent", False):
+                    consent = "OK"
+                else:
+                    text = f"Dave wants to launch {'prompt' if is_prompt else ''} {tool_name} with arguments: {tool_args}.\nThis tool has the following description: {tool_desc}.\n"
+                    text += "Do you consent to the execution? [Y/N]: "
+                    progress(f"waiting for consent to {tool_name}")
+                    consent = await self.window.ask_user_consent(text)
+
+                # No consent obtained, none of the calls are executed
+                if consent.upper() != "Y" and consent.upper() != "OK":
+                    refusal = "Dave did not obtain the necessary consent for execution."
+                    self.conversation.commit(
                         [
-                            t["function"]["description"]
-                            for t in available_tools
-                            if t["function"]["name"] == tool_name
+                            messages[turn_start],
+                            {"role": "assistant", "content": refusal},
                         ]
                     )
-                    # Does the tool need consent?
-                    needs_consent = "[consent]" in tool_desc.lower()
-
-                    # Is the tool a prompt?
-                    is_prompt = "[prompt]" in tool_desc.lower()
-
-                    # Ask user for consent
-                    if not needs_consent:
-                        consent = "OK"
-                    else:
-                        text = f"Dave wants to launch {'prompt' if is_prompt else ''} {tool_name} with arguments: {tool_args}.\nThis tool has the following description: {tool_desc}.\n"
-                        text += "Do you consent to the execution? [Y/N]: "
-                        consent = await self.window.ask_user_consent(text)
-
-                    # User consents
-                    if consent.upper() == "Y" or consent.upper() == "OK":
-                        # Collect tool call response
-                        result = await self.session.call_tool(tool_name, tool_args)
-
-                        # Collect logs and tool results
-                        tool_results.append({"call": tool_name, "result": result})
-                        final_text.append(
-                            f"[Called {'prompt' if is_prompt else 'tool'} {tool_name} with arguments: {tool_args}].\n"
-                        )
-
-                        # Update messages
-                        messages.append(
-                            {
-                                "role": "assistant",
-                                "tool_calls": [
-                                    {
-                                        "id": call.id,
-                                        "type": "function",
-                                        "function": {
-                                            "name": tool_name,
-                                            "arguments": json.dumps(tool_args),
-                                        },
-                                    }
-                                ],
-                            }
-                        )
-
-                        messages.append(
-                            {
-                                "role": "tool",
-                                "tool_call_id": call.id,
-                                "content": result.content,
-                            }
-                        )
-
-                        # Feed LLM tool call results
-                        response = self.azure.chat.completions.create(
-                            model="gpt-4o",
-                            max_tokens=1000,
-                            messages=messages,
-                            tools=available_tools,
-                            tool_choice="auto",
-                        )
-
-                    # No consent obtained
-                    else:
-                        final_text.append(
-                            "Dave did not obtain the necessary consent for execution."
-                        )
-                        return "\n".join(final_text)
-
-            # No tool call (end of turn)
-            elif message.content:
-                final_text.append(message.content)
-                break
-        result_text = "\n".join(final_text)
-        result_text = result_text.rstrip("\n")
-        return result_text
+                    yield refusal
+                    return
+
+                pending.append((call["id"], tool_name, tool_args, is_prompt))
+
+            # Execute all tool calls of the turn concurrently
+            progress(f"calling {', '.join(name for _, name, _, _ in pending)}")
+            execution = asyncio.gather(
+                *(
+                    self.session.call_tool(tool_name, tool_args)
+                    for _, tool_name, tool_args, _ in pending
+                )
+            )
+            cancelled = False
+            try:
+                results = await asyncio.shield(execution)
+            except asyncio.CancelledError:
+                cancelled = True
+                results = await execution
+
+            # Update messages with the assistant turn and one result per call
+            messages.append(
+                {
+                    "role": "assistant",
+                    "content": "".join(reply) or None,
+                    "tool_calls": [
+                        {
+                            "id": call_id,
+                            "type": "function",
+                            "function": {
+                                "name": tool_name,
+                                "arguments": json.dumps(tool_args),
+                            },
+                        }
+                        for call_id, tool_name, tool_args, _ in pending
+                    ],
+                }
+            )
+
+            for (call_id, tool_name, tool_args, is_prompt), result in zip(
+                pending, results
+            ):
+                # Log tool call
+                yield f"[Called {'prompt' if is_prompt else 'tool'} {tool_name} with arguments: {tool_args}].\n\n"
+
+                messages.append(
+                    {
+                        "role": "tool",
+                        "tool_call_id": call_id,
+                        "content": self.tool_result_text(result),
+                    }
+                )
+
+            if cancelled:
+                raise asyncio.CancelledError
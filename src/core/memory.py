@@ -0,0 +1,85 @@
+# ----------CONVERSATION MEMORY-----------
+class Conversation:
+    """Message history kept across queries, bounded by a token budget.
+
+    History is stored as whole turns (user query, tool calls, tool results and the
+    final reply) so that evicting old turns never separates a tool call from its
+    result. Token counts are estimated once per message when it is added.
+    """
+
+    def __init__(self, token_budget: int = 8000, tool_result_chars: int = 600):
+        """Initialise conversation memory
+
+        Args:
+            token_budget (int, optional): maximum estimated tokens of kept history. Defaults to 8000.
+            tool_result_chars (int, optional): characters kept of tool results once their turn is over. Defaults to 600.
+        """
+        self.token_budget = token_budget
+        self.tool_result_chars = tool_result_chars
+        # Each turn is a (messages, tokens) pair
+        self.turns: list[tuple[list, int]] = []
+        self.tokens = 0
+
+    @staticmethod
+    def count_tokens(message: dict) -> int:
+        """Estimates the number of tokens of a message (about 4 characters per token)
+
+        Args:
+            message (dict): OpenAI chat message
+
+        Returns:
+            int: estimated token count
+        """
+        size = len(message.get("content") or "")
+        for call in message.get("tool_calls") or []:
+            size += len(call["function"]["name"]) + len(call["function"]["arguments"])
+        # Every message also costs a few tokens of framing
+        return size // 4 + 4
+
+    def compact(self, message: dict) -> dict:
+        """Truncates a tool result kept in history
+
+        Args:
+            message (dict): OpenAI chat message
+
+        Returns:
+            dict: message, with its content truncated if it is an oversized tool result
+        """
+        content = message.get("content") or ""
+        if message["role"] != "tool" or len(content) <= self.tool_result_chars:
+            return message
+        dropped = len(content) - self.tool_result_chars
+        return {
+            **message,
+            "content": content[: self.tool_result_chars]
+            + f"... [{dropped} characters truncated, call the tool again for details]",
+        }
+
+    def messages(self) -> list:
+        """Returns the kept history, oldest first
+
+        Returns:
+            list: OpenAI chat messages
+        """
+        return [message for turn, _ in self.turns for message in turn]
+
+    def commit(self, turn: list):
+        """Adds a finished turn to the history and evicts old turns over the budget
+
+        Args:
+            turn (list): OpenAI chat messages of the turn, starting with the user query
+        """
+        turn = [self.compact(message) for message in turn]
+        tokens = sum(self.count_tokens(message) for message in turn)
+        self.turns.append((turn, tokens))
+        self.tokens += tokens
+
+        # Evict oldest turns, always keeping the latest one
+        while self.tokens > self.token_budget and len(self.turns) > 1:
+            _, evicted = self.turns.pop(0)
+            self.tokens -= evicted
+
+    def clear(self):
+        """Forgets the whole history"""
+        self.turns.clear()
+        self.tokens = 0
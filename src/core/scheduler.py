@@ -0,0 +1,137 @@
+# -----------IMPORTS-----------
+import asyncio
+
+
+# ----------POLICIES-----------
+# How a query submitted while others are in flight is handled:
+# - serial: waits for the previous queries to finish, in submission order
+# - parallel: runs alongside them
+# - cancel: cancels them and runs alone
+POLICIES = ("serial", "parallel", "cancel")
+
+
+# ----------QUERY REQUEST-----------
+class QueryRequest:
+    """A query submitted to the scheduler, with its progress and task"""
+
+    def __init__(self, query: str, on_change):
+        """Initialise request
+
+        Args:
+            query (str): user query
+            on_change (callable): called without arguments when the status changes
+        """
+        self.query = query
+        self.status = "queued"
+        self.on_change = on_change
+        self.task: asyncio.Task | None = None
+        # Cancelled to make way for a newer query, rather than by the user
+        self.superseded = False
+
+    def report(self, status: str):
+        """Updates the progress of the request
+
+        Args:
+            status (str): what the request is doing, e.g. "thinking"
+        """
+        self.status = status
+        self.on_change()
+
+    def cancel(self, superseded: bool = False) -> bool:
+        """Cancels the request's task
+
+        Args:
+            superseded (bool, optional): cancelled for a newer query. Defaults to False.
+
+        Returns:
+            bool: False if the request already finished
+        """
+        if self.task is None or self.task.done():
+            return False
+        self.superseded = superseded
+        return self.task.cancel()
+
+
+# ----------QUERY SCHEDULER-----------
+class QueryScheduler:
+    """Runs the queries of the chat window according to a policy.
+
+    Every query runs in its own task, so cancelling a request cancels whatever it
+    awaits (LLM stream, consent dialog, tool calls). Each query works on its own
+    copy of the conversation and commits its turn in one go, so queries running in
+    parallel never interleave their message histories.
+    """
+
+    def __init__(self, policy: str = "serial", on_change=None):
+        """Initialise scheduler
+
+        Args:
+            policy (str, optional): one of POLICIES. Defaults to "serial".
+            on_change (callable, optional): called without arguments when requests start, progress or finish. Defaults to None.
+
+        Raises:
+            ValueError: unknown policy
+        """
+        if policy not in POLICIES:
+            raise ValueError(
+                f"Unknown query policy '{policy}', expected one of {', '.join(POLICIES)}"
+            )
+        self.policy = policy
+        self.on_change = on_change or (lambda: None)
+        # Requests in flight or queued, oldest first
+        self.requests: list[QueryRequest] = []
+        # Held by the running query under the serial policy, FIFO for the others
+        self.lock = asyncio.Lock()
+
+    def submit(self, query: str, run) -> QueryRequest:
+        """Schedules a query
+
+        Args:
+            query (str): user query
+            run (callable): coroutine function processing the query, given its QueryRequest to report progress
+
+        Returns:
+            QueryRequest: request, await its task for the result
+        """
+        if self.policy == "cancel":
+            for request in self.requests:
+                request.cancel(superseded=True)
+
+        request = QueryRequest(query, self.on_change)
+        request.task = asyncio.ensure_future(self.execute(request, run))
+        request.task.add_done_callback(lambda _: self.finished(request))
+        self.requests.append(request)
+        self.on_change()
+        return request
+
+    async def execute(self, request: QueryRequest, run):
+        """Runs a request once the policy allows it
+
+        Args:
+            request (QueryRequest): request to run
+            run (callable): coroutine function processing the query
+        """
+        if self.policy != "serial":
+            return await run(request)
+        async with self.lock:
+            return await run(request)
+
+    def finished(self, request: QueryRequest):
+        """Forgets a request once its task is done
+
+        Args:
+            request (QueryRequest): finished request
+        """
+        self.requests.remove(request)
+        self.on_change()
+
+    def cancel_latest(self) -> bool:
+        """Cancels the most recently submitted request still in flight
+
+        Returns:
+            bool: False if there was nothing to cancel
+        """
+        for request in reversed(self.requests):
+            if request.cancel():
+                return True
+        return False
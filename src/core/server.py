@@ -1,26 +1,134 @@
 # ---------IMPORTS---------
+import asyncio
 import os
+import sys
 import json
-import requests
+import math
+
+from contextlib import asynccontextmanager
 
 from trello import TrelloClient
 
+from board import BoardCache
+from store import BoardStore
+from transport import TrelloTransport
+from webhook import WebhookReceiver
+
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
 
 
+# ---------LIFESPAN---------
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Warms the board snapshot from disk and keeps it in sync for the session.
+
+    A snapshot saved by a previous session is served right away, while a cheap
+    request checks in the background whether the board changed since.
+
+    Args:
+        server (FastMCP): MCP server
+    """
+    revalidation = None
+    if await cache.load_snapshot():
+        revalidation = asyncio.create_task(cache.revalidate())
+
+    try:
+        async with webhook_sync():
+            yield
+    finally:
+        if revalidation is not None:
+            revalidation.cancel()
+
+
+@asynccontextmanager
+async def webhook_sync():
+    """Runs the Trello webhook receiver alongside the server if TRELLO_WEBHOOK_PORT is set.
+
+    Webhook actions are applied to the board snapshot as deltas. If a public
+    TRELLO_WEBHOOK_CALLBACK_URL is also set, the webhook is registered with Trello for
+    the session and the snapshot stops being refetched on a TTL.
+    """
+    port = os.getenv("TRELLO_WEBHOOK_PORT")
+    if not port:
+        yield
+        return
+
+    callback_url = os.getenv("TRELLO_WEBHOOK_CALLBACK_URL")
+    receiver = WebhookReceiver(
+        cache.apply_action,
+        asyncio.get_running_loop(),
+        host=os.getenv("TRELLO_WEBHOOK_HOST", "127.0.0.1"),
+        port=int(port),
+        secret=os.getenv("TRELLO_API_SECRET"),
+        callback_url=callback_url,
+    )
+    receiver.start()
+
+    webhook_id = None
+    if callback_url:
+        query = {
+            "callbackURL": callback_url,
+            "idModel": BOARD_ID,
+            "description": "Dave board sync",
+        }
+        response = await trello.post("/webhooks", params=query)
+        if response.status_code == 200:
+            webhook_id = response.json()["id"]
+            # Deltas keep the snapshot current, no need to poll
+            cache.ttl = math.inf
+        else:
+            print(
+                f"Error: webhook registration failed: {response.text}", file=sys.stderr
+            )
+
+    try:
+        yield
+    finally:
+        if webhook_id is not None:
+            await trello.delete(f"/webhooks/{webhook_id}")
+        receiver.stop()
+
+
 # ----------INIT------------
-mcp = FastMCP("dave")
+mcp = FastMCP("dave", lifespan=lifespan)
 
 load_dotenv()
 
 BOARD_ID = os.getenv("BOARD_ID")
 
 
+# Pooled HTTP session shared by raw REST calls and py-trello
+trello = TrelloTransport(
+    api_key=os.getenv("TRELLO_API_KEY"),
+    token=os.getenv("TRELLO_API_TOKEN"),
+    pool_size=int(os.getenv("TRELLO_POOL_SIZE", "10")),
+    key_limit=int(os.getenv("TRELLO_KEY_RATE_LIMIT", "300")),
+    token_limit=int(os.getenv("TRELLO_TOKEN_RATE_LIMIT", "100")),
+)
+
 client = TrelloClient(
     api_key=os.getenv("TRELLO_API_KEY"),
     api_secret=os.getenv("TRELLO_API_SECRET"),
     token=os.getenv("TRELLO_API_TOKEN"),
+    http_service=trello.session,
+)
+
+# Maximum number of concurrent requests made by batch tools
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "5"))
+
+# Last board snapshot and card search index, kept on disk for warm restarts
+# If set to "", they are kept in memory only
+BOARD_CACHE_FILE = os.getenv("BOARD_CACHE_FILE", "../board_cache.sqlite3")
+store = BoardStore(BOARD_CACHE_FILE or ":memory:")
+
+# Board snapshot shared by all tools
+cache = BoardCache(
+    client,
+    trello,
+    BOARD_ID,
+    ttl=float(os.getenv("BOARD_CACHE_TTL", "30")),
+    store=store,
 )
 
 
@@ -29,73 +137,179 @@ def format_card(card, trello_list) -> dict:
     """Formats card variables in dictionary
 
     Args:
-        card (Trello card object): card to format
-        trello_list (Trello list object): list containing card
+        card (dict): raw Trello card to format
+        trello_list (dict): raw Trello list containing card
 
     Returns:
         dict: formatted card variables
     """
     return {
-        "id": card.id,
-        "name": card.name,
-        "description": card.description,
-        "labels": [label.name for label in card.labels],
-        "url": card.short_url,
-        "list": {"list_id": trello_list.id, "list_name": trello_list.name},
+        "id": card["id"],
+        "name": card["name"],
+        "description": card["desc"],
+        "labels": [label["name"] for label in card["labels"]],
+        "url": card["shortUrl"],
+        "list": {"list_id": trello_list["id"], "list_name": trello_list["name"]},
     }
 
 
-def get_card_by_name(card_name: str):
+async def get_card_by_name(card_name: str):
     """Get Trello card object using name
 
     Args:
         card_name (str): name of card to get
 
+    Raises:
+        AmbiguousNameError: several cards bear the name
+        UnknownNameError: no card bears the name, with the closest names as suggestions
+
     Returns:
-        Trello card item: card object corresponding to given name
+        dict: raw Trello card corresponding to given name
     """
-    return next(
-        (card for card in board.open_cards() if card.name.lower() == card_name.lower()),
-        None,
-    )
+    return await cache.find_card(card_name)
 
 
-def get_list_by_name(list_name: str):
+async def get_list_by_name(list_name: str):
     """Get Trello list object using name
 
     Args:
         list_name (str): name of list to format
 
+    Raises:
+        AmbiguousNameError: several lists bear the name
+        UnknownNameError: no list bears the name, with the closest names as suggestions
+
     Returns:
-        Trello list object: list object corresponding to given name
+        dict: raw Trello list corresponding to given name
     """
-    return next(
-        (
-            trello_list
-            for trello_list in board.open_lists()
-            if trello_list.name.lower() == list_name.lower()
-        ),
-        None,
-    )
+    return await cache.find_list(list_name)
 
 
-def get_label_by_name(label_name: str):
+async def get_label_by_name(label_name: str):
     """Get Trello label object using name
 
     Args:
         label_name (str): name of label to get
 
+    Raises:
+        AmbiguousNameError: several labels bear the name
+        UnknownNameError: no label bears the name, with the closest names as suggestions
+
     Returns:
-        Trello label object: label object corresponding to given name
+        dict: raw Trello label corresponding to given name
     """
-    return next(
-        (
-            label
-            for label in board.get_labels()
-            if label.name.lower() == label_name.lower()
-        ),
-        None,
-    )
+    return await cache.find_label(label_name)
+
+
+async def select_cards(
+    list_name: str,
+    contains: str | None = None,
+    offset: int = 0,
+    limit: int | None = None,
+    search_description: bool = False,
+) -> list:
+    """Selects open cards of the board or of a list, filtered and paged
+
+    Args:
+        list_name (str): name of list to get cards from, or "ALL"
+        contains (Optional[str], optional): case-insensitive substring the card name must contain. Defaults to None.
+        offset (int, optional): number of matching cards to skip. Defaults to 0.
+        limit (Optional[int], optional): maximum number of cards to return. Defaults to None (no limit).
+        search_description (bool, optional): also match contains against descriptions. Defaults to False.
+
+    Returns:
+        list: (card, list) pairs of raw Trello objects in board order
+    """
+    if list_name == "ALL":
+        lists = await cache.lists()
+    else:
+        lists = [await get_list_by_name(list_name)]
+
+    needle = contains.casefold() if contains else None
+    selected = []
+    for trello_list in lists:
+        for card in await cache.list_cards(trello_list["id"]):
+            if needle is not None and needle not in card["name"].casefold():
+                if not search_description or needle not in card["desc"].casefold():
+                    continue
+            selected.append((card, trello_list))
+
+    end = None if limit is None else offset + limit
+    return selected[offset:end]
+
+
+async def select_targets(
+    card_names: list[str] | None = None,
+    from_list: str | None = None,
+    contains: str | None = None,
+    label: str | None = None,
+) -> tuple[list, list]:
+    """Resolves the open cards targeted by a batch tool against one board snapshot
+
+    Args:
+        card_names (Optional[list[str]], optional): names of the cards to target. Defaults to None.
+        from_list (Optional[str], optional): only target cards of this list. Defaults to None.
+        contains (Optional[str], optional): only target cards whose name contains this text. Defaults to None.
+        label (Optional[str], optional): only target cards bearing this label. Defaults to None.
+
+    Returns:
+        tuple[list, list]: raw Trello cards found, and per-name errors for names that could not be resolved
+    """
+    if card_names:
+        # Keyed by ID, so names given twice act on their card once
+        cards, errors = {}, []
+        for card_name in card_names:
+            try:
+                card = await get_card_by_name(card_name)
+                cards.setdefault(card["id"], card)
+            except Exception as e:
+                errors.append({"card": card_name, "error": str(e)})
+        return list(cards.values()), errors
+
+    if not (from_list or contains or label):
+        raise ValueError(
+            "Give card_names or at least one of from_list, contains, label."
+        )
+
+    selected = await select_cards(from_list or "ALL", contains)
+    cards = [card for card, _ in selected]
+    if label:
+        label_id = (await get_label_by_name(label))["id"]
+        cards = [card for card in cards if label_id in card["idLabels"]]
+    return cards, []
+
+
+async def run_batch(cards: list, action, errors: list | None = None) -> dict:
+    """Runs an action on many cards concurrently, within BATCH_CONCURRENCY
+
+    Args:
+        cards (list): raw Trello cards to act on
+        action (Callable[[dict], Awaitable[Response]]): sends the request for one card
+        errors (Optional[list], optional): per-card results known before acting, e.g. errors found while resolving targets. Defaults to None.
+
+    Returns:
+        dict: counts of succeeded and failed cards, and the result of each card
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run_one(card: dict) -> dict:
+        async with semaphore:
+            try:
+                response = await action(card)
+            except Exception as e:
+                return {"card": card["name"], "id": card["id"], "error": str(e)}
+        if response.status_code != 200:
+            return {"card": card["name"], "id": card["id"], "error": response.text}
+        return {"card": card["name"], "id": card["id"], "status": "ok"}
+
+    results = list(errors or [])
+    results += await asyncio.gather(*(run_one(card) for card in cards))
+    failed = sum("error" in result for result in results)
+    return {
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "results": results,
+    }
 
 
 # -----------TOOLS-----------
@@ -110,8 +324,8 @@ async def get_lists() -> list:
         list: json dump of lists
     """
     try:
-        lists = board.open_lists()
-        return json.dumps([{"id": lst.id, "name": lst.name} for lst in lists])
+        lists = await cache.lists()
+        return json.dumps([{"id": lst["id"], "name": lst["name"]} for lst in lists])
     except Exception as e:
         print(f"Error: {e}")
         return [e]
@@ -128,20 +342,19 @@ async def create_list(list_name: str | None = "New List") -> dict:
         dict : JSON response of created list or error
     """
     try:
-        url = "https://api.trello.com/1/lists"
+        path = "/lists"
 
         query = {
-            "key": os.getenv("TRELLO_API_KEY"),
-            "token": os.getenv("TRELLO_API_TOKEN"),
             "idBoard": BOARD_ID,
             "name": list_name,
         }
 
-        response = requests.post(url, data=query, timeout=20)
+        response = await trello.post(path, data=query)
 
         if response.status_code != 200:
             return response.text
 
+        cache.put_list(response.json())
         return response.json()
 
     except Exception as e:
@@ -168,21 +381,32 @@ async def move_list(
         str: None or error
     """
     try:
-        moving_list = get_list_by_name(list_name)
+        moving_list = await get_list_by_name(list_name)
 
         if action in ["top", "bottom"]:
-            moving_list.set_pos(action)
-            return "Successfully moved list."
+            pos = action
         elif action == "between":
             if lower_list and upper_list:
-                lower_pos = get_list_by_name(lower_list).pos
-                upper_pos = get_list_by_name(upper_list).pos
+                lower_pos = (await get_list_by_name(lower_list))["pos"]
+                upper_pos = (await get_list_by_name(upper_list))["pos"]
             else:
                 return "A boundary list was not given."
-            moving_list.set_pos((lower_pos + upper_pos) / 2)
-            return "Successfully moved list."
+            pos = (lower_pos + upper_pos) / 2
         else:
             return "Invalid action selected by LLM, action can only be 'top','bottom','between'."
+
+        path = f"/lists/{moving_list['id']}"
+        query = {
+            "pos": pos,
+        }
+
+        response = await trello.put(path, params=query)
+
+        if response.status_code != 200:
+            return response.text
+
+        cache.put_list(response.json())
+        return "Successfully moved list."
     except Exception as e:
         print(f"Error: {e}")
         return e
@@ -192,48 +416,35 @@ async def move_list(
 
 
 @mcp.tool()
-async def get_cards_short(list_name: str | None = "ALL") -> list:
-    """Returns cards of a given board or all cards of the board in a shortened format
+async def get_cards_short(
+    list_name: str | None = "ALL",
+    contains: str | None = None,
+    offset: int = 0,
+    limit: int | None = None,
+) -> list:
+    """Returns cards of a given board or all cards of the board in a shortened format. Use contains, offset and limit to narrow down large boards.
 
     Args:
         list_name (Optional[str], optional): name of list to get cards from. Defaults to "ALL".
+        contains (Optional[str], optional): only return cards whose name contains this text. Defaults to None.
+        offset (int, optional): number of matching cards to skip, for paging. Defaults to 0.
+        limit (Optional[int], optional): maximum number of cards to return. Defaults to None (all cards).
 
     Returns:
         list: json dump of card list, with each card's id, name and list
     """
     try:
         result = []
-        lists = board.list_lists()
-        if list_name == "ALL":
-            for trello_list in lists:
-                cards = trello_list.list_cards()
-                for card in cards:
-                    result.append(
-                        {
-                            "id": card.id,
-                            "name": card.name,
-                            "list": {
-                                "list_id": trello_list.id,
-                                "list_name": trello_list.name,
-                            },
-                        }
-                    )
-        else:
-            trello_list = get_list_by_name(list_name)
-            cards = trello_list.list_cards()
-            for card in cards:
-                result.append(
-                    [
-                        {
-                            "id": card.id,
-                            "name": card.name,
-                            "list": {
-                                "list_id": trello_list.id,
-                                "list_name": trello_list.name,
-                            },
-                        }
-                    ]
-                )
+        for card, trello_list in await select_cards(list_name, contains, offset, limit):
+            short = {
+                "id": card["id"],
+                "name": card["name"],
+                "list": {
+                    "list_id": trello_list["id"],
+                    "list_name": trello_list["name"],
+                },
+            }
+            result.append(short if list_name == "ALL" else [short])
         return json.dumps(result)
     except Exception as e:
         print(f"Error: {e}")
@@ -241,28 +452,35 @@ async def get_cards_short(list_name: str | None = "ALL") -> list:
 
 
 @mcp.tool()
-async def get_cards_detailed(list_name: str | None = "ALL") -> list:
-    """Returns cards of a given board or all cards of the board in a detailed format
+async def get_cards_detailed(
+    list_name: str | None = "ALL",
+    fields: list[str] | None = None,
+    contains: str | None = None,
+    offset: int = 0,
+    limit: int | None = None,
+) -> list:
+    """Returns cards of a given board or all cards of the board in a detailed format. Use fields, contains, offset and limit to keep results small on large boards.
 
     Args:
         list_name (Optional[str], optional): name of list to get cards from. Defaults to "ALL".
+        fields (Optional[list[str]], optional): fields to return among id, name, description, labels, url and list. Defaults to None (all fields).
+        contains (Optional[str], optional): only return cards whose name or description contains this text. Defaults to None.
+        offset (int, optional): number of matching cards to skip, for paging. Defaults to 0.
+        limit (Optional[int], optional): maximum number of cards to return. Defaults to None (all cards).
 
     Returns:
         list: json dump of card list, with each card's id, name, description, labels, url, and list
     """
     try:
         result = []
-        lists = board.list_lists()
-        if list_name == "ALL":
-            for trello_list in lists:
-                cards = trello_list.list_cards()
-                for card in cards:
-                    result.append(format_card(card, trello_list))
-        else:
-            trello_list = get_list_by_name(list_name)
-            cards = trello_list.list_cards()
-            for card in cards:
-                result.append([format_card(card, trello_list)])
+        selected = await select_cards(
+            list_name, contains, offset, limit, search_description=True
+        )
+        for card, trello_list in selected:
+            detailed = format_card(card, trello_list)
+            if fields:
+                detailed = {key: detailed[key] for key in fields if key in detailed}
+            result.append(detailed if list_name == "ALL" else [detailed])
         return json.dumps(result)
     except Exception as e:
         print(f"Error: {e}")
@@ -288,21 +506,20 @@ async def create_card(
     Returns:
         dict: JSON response or error
     """
-    id_list = get_list_by_name(list_name).id
-    url = "https://api.trello.com/1/cards"
+    id_list = (await get_list_by_name(list_name))["id"]
+    path = "/cards"
     query = {
-        "key": os.getenv("TRELLO_API_KEY"),
-        "token": os.getenv("TRELLO_API_TOKEN"),
         "idList": id_list,
         "name": name,
         "desc": description,
     }
     try:
-        response = requests.post(url, params=query, timeout=20)
+        response = await trello.post(path, params=query)
 
         if response.status_code != 200:
             return response.text
 
+        cache.put_card(response.json())
         return response.json()
     except Exception as e:
         print(e)
@@ -317,7 +534,7 @@ async def return_labels() -> list:
         list: board's tags
     """
     try:
-        return board.get_labels()
+        return await cache.labels()
     except Exception as e:
         print(f"Error: {e}")
         return [e]
@@ -336,20 +553,19 @@ async def add_label(tag_name: str, card_name: str) -> dict:
 
     """
     try:
-        card_id = get_card_by_name(card_name).id
-        label_id = get_label_by_name(tag_name).id
-        url = f"https://api.trello.com/1/cards/{card_id}/idLabels"
+        card_id = (await get_card_by_name(card_name))["id"]
+        label_id = (await get_label_by_name(tag_name))["id"]
+        path = f"/cards/{card_id}/idLabels"
         query = {
-            "key": os.getenv("TRELLO_API_KEY"),
-            "token": os.getenv("TRELLO_API_TOKEN"),
             "value": label_id,
         }
 
-        response = requests.post(url, params=query, timeout=20)
+        response = await trello.post(path, params=query)
 
         if response.status_code != 200:
             return response.text
 
+        cache.set_card_labels(card_id, response.json())
         return response.json()
 
     except Exception as e:
@@ -369,21 +585,20 @@ async def move_card(card_name: str, list_name: str) -> dict:
         dict: JSON response or error
     """
     try:
-        card_id = get_card_by_name(card_name).id
-        list_id = get_list_by_name(list_name).id
+        card_id = (await get_card_by_name(card_name))["id"]
+        list_id = (await get_list_by_name(list_name))["id"]
 
-        url = f"https://api.trello.com/1/cards/{card_id}"
+        path = f"/cards/{card_id}"
         query = {
-            "key": os.getenv("TRELLO_API_KEY"),
-            "token": os.getenv("TRELLO_API_TOKEN"),
             "idList": list_id,
         }
 
-        response = requests.put(url, params=query, timeout=20)
+        response = await trello.put(path, params=query)
 
         if response.status_code != 200:
             return response.text
 
+        cache.put_card(response.json())
         return response.json()
 
     except Exception as e:
@@ -402,20 +617,19 @@ async def archive_card(card_name: str) -> dict:
         dict: JSON response or error
     """
     try:
-        card_id = get_card_by_name(card_name).id
+        card_id = (await get_card_by_name(card_name))["id"]
 
-        url = f"https://api.trello.com/1/cards/{card_id}"
+        path = f"/cards/{card_id}"
         query = {
-            "key": os.getenv("TRELLO_API_KEY"),
-            "token": os.getenv("TRELLO_API_TOKEN"),
             "closed": "true",
         }
 
-        response = requests.put(url, params=query, timeout=20)
+        response = await trello.put(path, params=query)
 
         if response.status_code != 200:
             return response.text
 
+        cache.put_card(response.json())
         # return response.json()
 
     except Exception as e:
@@ -424,21 +638,34 @@ async def archive_card(card_name: str) -> dict:
 
 
 @mcp.tool()
-async def get_archived_cards(limit: int | None = 5) -> list:
-    """Returns limit number of the last archived cards
+async def get_archived_cards(limit: int = 5, before: str | None = None) -> dict:
+    """Returns limit number of the last archived cards, most recently archived first. Pass the returned before cursor to get the next, older page.
 
     Args:
         limit (int, optional): threshold of cards to return. Defaults to 5.
+        before (Optional[str], optional): cursor returned with the previous page. Defaults to None (most recent cards).
 
     Returns:
-        list: list of limit number of last archived cards
+        dict: archived cards with their id, name, list, url and archive date, and the cursor of the next page (null on the last page)
     """
     try:
-        archived_cards = board.closed_cards()
-        return archived_cards[:limit]
+        cards, cursor = await cache.archived_cards(limit, before)
+        result = []
+        for card in cards:
+            trello_list = await cache.get_list(card["idList"])
+            result.append(
+                {
+                    "id": card["id"],
+                    "name": card["name"],
+                    "list": trello_list["name"] if trello_list else None,
+                    "url": card["shortUrl"],
+                    "archived_at": card["dateLastActivity"],
+                }
+            )
+        return {"cards": result, "before": cursor}
     except Exception as e:
         print(f"Error: {e}")
-        return [e]
+        return {"error": str(e)}
 
 
 @mcp.tool()
@@ -452,28 +679,20 @@ async def restore_card(card_name: str) -> dict:
         dict: JSON response or error
     """
     try:
-        card_id = next(
-            (
-                card
-                for card in board.closed_cards()
-                if card.name.lower() == card_name.lower()
-            ),
-            None,
-        ).id
-
-        url = f"https://api.trello.com/1/cards/{card_id}"
+        card_id = (await cache.find_archived_card(card_name))["id"]
+
+        path = f"/cards/{card_id}"
         query = {
-            "key": os.getenv("TRELLO_API_KEY"),
-            "token": os.getenv("TRELLO_API_TOKEN"),
             "closed": "false",
             "state": "incomplete",
         }
 
-        response = requests.put(url, params=query, timeout=20)
+        response = await trello.put(path, params=query)
 
         if response.status_code != 200:
             return response.text
 
+        cache.put_card(response.json())
         return response.json()
 
     except Exception as e:
@@ -500,16 +719,24 @@ async def change_card(
         str : returns success message or error
     """
     try:
-        card = get_card_by_name(card_name)
+        card = await get_card_by_name(card_name)
+        path = f"/cards/{card['id']}"
+        query = {}
         if new_title is not None:
-            card.set_name(new_title)
+            query["name"] = new_title
         if new_description is not None:
             if not replace_description:
-                current = card.desc
-                new = current + " " + new_description
-                card.set_description(new)
+                current = card["desc"]
+                query["desc"] = current + " " + new_description
             else:
-                card.set_description(new_description)
+                query["desc"] = new_description
+
+        response = await trello.put(path, params=query)
+
+        if response.status_code != 200:
+            return response.text
+
+        cache.put_card(response.json())
         return "The card has been successfully changed."
     except Exception as e:
         print(f"Error: {e}")
@@ -526,13 +753,90 @@ async def filter_by_label(label_name: str) -> list:
     Returns:
         list: cards with the given label
     """
-    cards = board.get_cards("open")
-    label_id = get_label_by_name(label_name).id
-    filtered = [card.name for card in cards if label_id in card.idLabels]
+    label_id = (await get_label_by_name(label_name))["id"]
+    filtered = [card["name"] for card in await cache.label_query(all_of=[label_id])]
 
     return filtered
 
 
+@mcp.tool()
+async def query_labels(
+    all_of: list[str] | None = None,
+    any_of: list[str] | None = None,
+    none_of: list[str] | None = None,
+    list_name: str | None = None,
+) -> list:
+    """Finds cards by combining labels, e.g. cards labelled AI and (Urgent or Bug) but not Done. Conditions are combined with AND.
+
+    Args:
+        all_of (Optional[list[str]], optional): labels the cards must all bear (AND). Defaults to None.
+        any_of (Optional[list[str]], optional): labels the cards must bear at least one of (OR). Defaults to None.
+        none_of (Optional[list[str]], optional): labels the cards must not bear (NOT). Defaults to None.
+        list_name (Optional[str], optional): only return cards of this list. Defaults to None (whole board).
+
+    Returns:
+        list: json dump of matching cards, with each card's id, name, list and labels
+    """
+    try:
+
+        async def label_ids(names):
+            return [(await get_label_by_name(name))["id"] for name in names or ()]
+
+        list_id = (await get_list_by_name(list_name))["id"] if list_name else None
+        cards = await cache.label_query(
+            all_of=await label_ids(all_of),
+            any_of=await label_ids(any_of),
+            none_of=await label_ids(none_of),
+            list_id=list_id,
+        )
+
+        result = []
+        for card in cards:
+            trello_list = await cache.get_list(card["idList"])
+            result.append(
+                {
+                    "id": card["id"],
+                    "name": card["name"],
+                    "list": trello_list["name"] if trello_list else None,
+                    "labels": [label["name"] for label in card["labels"]],
+                }
+            )
+        return json.dumps(result)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return [e]
+
+
+@mcp.tool()
+async def search_cards(query: str, limit: int = 10) -> list:
+    """Searches open cards by words of their name, description or labels, best match first. Prefer this over listing all cards when looking for specific cards.
+
+    Args:
+        query (str): words to look for, e.g. "deploy staging"
+        limit (int, optional): maximum number of cards to return. Defaults to 10.
+
+    Returns:
+        list: json dump of matching cards, with each card's id, name, list, labels and the matching part of its description
+    """
+    try:
+        result = []
+        for card, snippet in await cache.search(query, limit):
+            trello_list = await cache.get_list(card["idList"])
+            result.append(
+                {
+                    "id": card["id"],
+                    "name": card["name"],
+                    "list": trello_list["name"] if trello_list else None,
+                    "labels": [label["name"] for label in card["labels"]],
+                    "match": snippet,
+                }
+            )
+        return json.dumps(result)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return [e]
+
+
 @mcp.tool()
 async def create_card_from_file(
     file_name: str, list_name: str | None = "Divers"
@@ -571,14 +875,14 @@ async def save_card_to_file(card_name: str, file_name: str | None = None) -> dic
         dict: JSON response or error
     """
     try:
-        card = get_card_by_name(card_name)
+        card = await get_card_by_name(card_name)
         if not file_name:
-            file_name = card.name.replace(
+            file_name = card["name"].replace(
                 " ", "_"
             )  # Replace spaces with underscores for filename
 
         with open(f"../cards/{file_name}.md", "w") as file:
-            file.write(card.description)
+            file.write(card["desc"])
 
         return {"message": f"Card '{card_name}' saved to {file_name}.md successfully."}
 
@@ -614,29 +918,197 @@ async def update_card_from_file(file_name: str, card_name: str | None = None) ->
         return {"error": str(e)}
 
 
+# -----------BATCH CARD MANIP------------
+
+
+@mcp.tool()
+async def move_cards(
+    list_name: str,
+    card_names: list[str] | None = None,
+    from_list: str | None = None,
+    contains: str | None = None,
+    label: str | None = None,
+) -> dict:
+    """[consent] Moves many cards to another list in one call. Targets the cards named in card_names, or else every card matching the filters from_list, contains and label.
+
+    Args:
+        list_name (str): name of target list to move cards to
+        card_names (Optional[list[str]], optional): names of cards to move. Defaults to None.
+        from_list (Optional[str], optional): move cards of this list. Defaults to None.
+        contains (Optional[str], optional): move cards whose name contains this text. Defaults to None.
+        label (Optional[str], optional): move cards bearing this label. Defaults to None.
+
+    Returns:
+        dict: number of cards moved and failed, with a result per card
+    """
+    try:
+        cards, errors = await select_targets(card_names, from_list, contains, label)
+        list_id = (await get_list_by_name(list_name))["id"]
+
+        async def move(card):
+            response = await trello.put(
+                f"/cards/{card['id']}", params={"idList": list_id}
+            )
+            if response.status_code == 200:
+                cache.put_card(response.json())
+            return response
+
+        return await run_batch(cards, move, errors)
+
+    except Exception as e:
+        print(f"Error {e}", file=sys.stderr)
+        return {"error": str(e)}
+
+
+@mcp.tool()
+async def archive_cards(
+    card_names: list[str] | None = None,
+    from_list: str | None = None,
+    contains: str | None = None,
+    label: str | None = None,
+) -> dict:
+    """[consent] Archives many cards in one call, e.g. "archive everything in Done". Targets the cards named in card_names, or else every card matching the filters from_list, contains and label.
+
+    Args:
+        card_names (Optional[list[str]], optional): names of cards to archive. Defaults to None.
+        from_list (Optional[str], optional): archive cards of this list. Defaults to None.
+        contains (Optional[str], optional): archive cards whose name contains this text. Defaults to None.
+        label (Optional[str], optional): archive cards bearing this label. Defaults to None.
+
+    Returns:
+        dict: number of cards archived and failed, with a result per card
+    """
+    try:
+        cards, errors = await select_targets(card_names, from_list, contains, label)
+
+        async def archive(card):
+            response = await trello.put(
+                f"/cards/{card['id']}", params={"closed": "true"}
+            )
+            if response.status_code == 200:
+                cache.put_card(response.json())
+            return response
+
+        return await run_batch(cards, archive, errors)
+
+    except Exception as e:
+        print(f"Error {e}", file=sys.stderr)
+        return {"error": str(e)}
+
+
+@mcp.tool()
+async def add_label_to_cards(
+    tag_name: str,
+    card_names: list[str] | None = None,
+    from_list: str | None = None,
+    contains: str | None = None,
+    label: str | None = None,
+) -> dict:
+    """[consent] Adds a label or a tag to many cards in one call, e.g. "label all MCP cards with AI". Targets the cards named in card_names, or else every card matching the filters from_list, contains and label.
+
+    Args:
+        tag_name (str): name of the label to give to the cards
+        card_names (Optional[list[str]], optional): names of cards to tag. Defaults to None.
+        from_list (Optional[str], optional): tag cards of this list. Defaults to None.
+        contains (Optional[str], optional): tag cards whose name contains this text. Defaults to None.
+        label (Optional[str], optional): tag cards already bearing this label. Defaults to None.
+
+    Returns:
+        dict: number of cards tagged and failed, with a result per card. Cards already bearing the label count as tagged, with status "already labelled".
+    """
+    try:
+        cards, errors = await select_targets(card_names, from_list, contains, label)
+        label_id = (await get_label_by_name(tag_name))["id"]
+        # Cards already bearing the label would make Trello answer with an error
+        for card in cards:
+            if label_id in card["idLabels"]:
+                errors.append(
+                    {
+                        "card": card["name"],
+                        "id": card["id"],
+                        "status": "already labelled",
+                    }
+                )
+        cards = [card for card in cards if label_id not in card["idLabels"]]
+
+        async def add(card):
+            response = await trello.post(
+                f"/cards/{card['id']}/idLabels", params={"value": label_id}
+            )
+            if response.status_code == 200:
+                cache.set_card_labels(card["id"], response.json())
+            return response
+
+        return await run_batch(cards, add, errors)
+
+    except Exception as e:
+        print(f"Error {e}", file=sys.stderr)
+        return {"error": str(e)}
+
+
+@mcp.tool()
+async def restore_cards(card_names: list[str]) -> dict:
+    """[consent] Restores many archived cards in one call and marks them as incomplete. For names shared by several archived cards, restores the most recently archived one.
+
+    Args:
+        card_names (list[str]): names of the cards to restore from archive
+
+    Returns:
+        dict: number of cards restored and failed, with a result per card
+    """
+    try:
+        # Keyed by ID, so names given twice restore their card once
+        cards, errors = {}, []
+        for card_name in card_names:
+            try:
+                card = await cache.find_archived_card(card_name)
+                cards.setdefault(card["id"], card)
+            except Exception as e:
+                errors.append({"card": card_name, "error": str(e)})
+
+        async def restore(card):
+            response = await trello.put(
+                f"/cards/{card['id']}",
+                params={"closed": "false", "state": "incomplete"},
+            )
+            if response.status_code == 200:
+                cache.put_card(response.json())
+            return response
+
+        return await run_batch(list(cards.values()), restore, errors)
+
+    except Exception as e:
+        print(f"Error {e}", file=sys.stderr)
+        return {"error": str(e)}
+
+
 # ---------META DATA---------
 
 
 @mcp.tool()
-async def get_members() -> dict:
-    """Returns the members of the board
+async def warm_cache() -> str:
+    """[internal] Brings the board snapshot up to date ahead of tool calls. Called by the client when a query is submitted, not offered to the LLM.
 
     Returns:
-        dict: JSON response or error
+        str: "ok" or error
     """
     try:
-        url = f"https://api.trello.com/1/boards/{BOARD_ID}/members"
-        query = {
-            "key": os.getenv("TRELLO_API_KEY"),
-            "token": os.getenv("TRELLO_API_TOKEN"),
-        }
+        await cache.warm()
+        return "ok"
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return str(e)
 
-        response = requests.get(url, params=query, timeout=20)
 
-        if response.status_code != 200:
-            return response.text
+@mcp.tool()
+async def get_members() -> dict:
+    """Returns the members of the board
 
-        return response.json()
+    Returns:
+        dict: JSON response or error
+    """
+    try:
+        return await cache.members()
 
     except Exception as e:
         print(f"Error: {e}")
@@ -645,5 +1117,8 @@ async def get_members() -> dict:
 
 # ----------RUN SERVER------------
 if __name__ == "__main__":
-    board = client.get_board(BOARD_ID)
-    mcp.run()
+    try:
+        mcp.run()
+    finally:
+        trello.close()
+        store.close()
@@ -0,0 +1,276 @@
+# ---------IMPORTS---------
+import asyncio
+import re
+import sqlite3
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    board_id TEXT PRIMARY KEY,
+    date_last_activity TEXT NOT NULL,
+    board TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS card_search USING fts5(
+    card_id UNINDEXED,
+    board_id UNINDEXED,
+    name,
+    description,
+    labels,
+    tokenize = "unicode61 remove_diacritics 2"
+);
+CREATE TABLE IF NOT EXISTS card_search_rows (
+    card_id TEXT PRIMARY KEY,
+    board_id TEXT NOT NULL
+);
+"""
+
+# Relevance weights of the name, description and labels columns of card_search
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0)
+
+# Words of a search query, anything else is dropped so FTS5 syntax cannot leak in
+WORD = re.compile(r"\w+")
+
+
+# ---------BOARD STORE----------
+class BoardStore:
+    """SQLite file keeping the last board snapshot across server restarts.
+
+    Each board is stored as the JSON of its nested board request, along with
+    Trello's dateLastActivity so a restarted server can tell whether it changed.
+    Open cards are also mirrored in a full-text index over their names,
+    descriptions and label names. FTS5 cannot look its rows up by card ID, so each
+    card keeps the rowid of its row in card_search_rows, a plain table keyed by ID.
+
+    The connection is only used from a single worker thread, which keeps writes in
+    order and never blocks the event loop.
+    """
+
+    def __init__(self, path: str):
+        """Initialise board store
+
+        Args:
+            path (str): path of the SQLite file, created if missing
+        """
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store")
+        self.connection: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens the database on first use (runs in the store's thread)
+
+        Returns:
+            sqlite3.Connection: open connection
+        """
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path)
+            self.connection.executescript(SCHEMA)
+        return self.connection
+
+    def submit(self, function, *args):
+        """Queues a blocking database call in the store's thread without waiting for it
+
+        Calls run in submission order, so later reads see earlier writes.
+
+        Args:
+            function (callable): blocking function
+        """
+        self.executor.submit(function, *args)
+
+    async def run(self, function, *args):
+        """Runs a blocking database call in the store's thread
+
+        Args:
+            function (callable): blocking function
+
+        Returns:
+            Any: return value of the function
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    def _load(self, board_id: str) -> tuple | None:
+        """Reads the stored snapshot of a board (runs in the store's thread)"""
+        return (
+            self._connect()
+            .execute(
+                "SELECT date_last_activity, board FROM snapshots WHERE board_id = ?",
+                (board_id,),
+            )
+            .fetchone()
+        )
+
+    async def load(self, board_id: str) -> tuple | None:
+        """Reads the stored snapshot of a board
+
+        Args:
+            board_id (str): ID of the board
+
+        Returns:
+            tuple | None: dateLastActivity and board JSON, None if nothing is stored
+        """
+        return await self.run(self._load, board_id)
+
+    def _save(self, board_id: str, date_last_activity: str, board: str):
+        """Replaces the stored snapshot of a board (runs in the store's thread)"""
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)",
+                (board_id, date_last_activity, board),
+            )
+
+    async def save(self, board_id: str, date_last_activity: str, board: str):
+        """Replaces the stored snapshot of a board
+
+        Args:
+            board_id (str): ID of the board
+            date_last_activity (str): dateLastActivity of the board when fetched
+            board (str): JSON of the nested board request
+        """
+        await self.run(self._save, board_id, date_last_activity, board)
+
+    # ---------SEARCH INDEX----------
+    @staticmethod
+    def _search_row(board_id: str, card: dict) -> tuple:
+        """Builds the card_search row of a card
+
+        Args:
+            board_id (str): ID of the board
+            card (dict): raw Trello card object
+
+        Returns:
+            tuple: values of the card_search columns
+        """
+        labels = " ".join(label["name"] for label in card["labels"])
+        return card["id"], board_id, card["name"], card["desc"], labels
+
+    def _insert_row(self, connection: sqlite3.Connection, board_id: str, card: dict):
+        """Inserts the card_search row of a card under the rowid kept for it
+
+        Args:
+            connection (sqlite3.Connection): connection in a transaction
+            board_id (str): ID of the board
+            card (dict): raw Trello card object
+        """
+        connection.execute(
+            "INSERT OR IGNORE INTO card_search_rows VALUES (?, ?)",
+            (card["id"], board_id),
+        )
+        connection.execute(
+            """
+            INSERT INTO card_search (rowid, card_id, board_id, name, description, labels)
+            SELECT rowid, ?, ?, ?, ?, ? FROM card_search_rows WHERE card_id = ?
+            """,
+            (*self._search_row(board_id, card), card["id"]),
+        )
+
+    def _delete_row(self, connection: sqlite3.Connection, card_id: str):
+        """Deletes the card_search row of a card by its rowid, if it has one
+
+        Args:
+            connection (sqlite3.Connection): connection in a transaction
+            card_id (str): ID of the card
+        """
+        connection.execute(
+            """
+            DELETE FROM card_search
+            WHERE rowid = (SELECT rowid FROM card_search_rows WHERE card_id = ?)
+            """,
+            (card_id,),
+        )
+
+    def index_board(self, board_id: str, cards: list):
+        """Replaces the search index of a board (runs in the store's thread)
+
+        Args:
+            board_id (str): ID of the board
+            cards (list): raw Trello objects of its open cards
+        """
+        with self._connect() as connection:
+            # Rewrites every row of the board, so a scan costs nothing extra here
+            connection.execute(
+                "DELETE FROM card_search WHERE board_id = ?", (board_id,)
+            )
+            connection.execute(
+                "DELETE FROM card_search_rows WHERE board_id = ?", (board_id,)
+            )
+            for card in cards:
+                self._insert_row(connection, board_id, card)
+
+    def index_card(self, board_id: str, card: dict):
+        """Adds or replaces a card in the search index (runs in the store's thread)
+
+        Args:
+            board_id (str): ID of the board
+            card (dict): raw Trello card object
+        """
+        with self._connect() as connection:
+            self._delete_row(connection, card["id"])
+            self._insert_row(connection, board_id, card)
+
+    def unindex_card(self, card_id: str):
+        """Removes a card from the search index (runs in the store's thread)
+
+        Args:
+            card_id (str): ID of the card
+        """
+        with self._connect() as connection:
+            self._delete_row(connection, card_id)
+            connection.execute(
+                "DELETE FROM card_search_rows WHERE card_id = ?", (card_id,)
+            )
+
+    def _search(self, board_id: str, words: list, limit: int) -> list:
+        """Runs a ranked full-text search (runs in the store's thread)
+
+        Cards matching every word come first. If none do, cards matching any word
+        are returned instead.
+        """
+        # Each word is quoted, and matches as a prefix so "deploy" finds "deployment"
+        terms = [f'"{word}"*' for word in words]
+        for operator in (" AND ", " OR "):
+            rows = (
+                self._connect()
+                .execute(
+                    """
+                    SELECT card_id, snippet(card_search, 3, '[', ']', '...', 12)
+                    FROM card_search
+                    WHERE card_search MATCH ? AND board_id = ?
+                    ORDER BY bm25(card_search, 0, 0, ?, ?, ?)
+                    LIMIT ?
+                    """,
+                    (operator.join(terms), board_id, *SEARCH_WEIGHTS, limit),
+                )
+                .fetchall()
+            )
+            if rows or len(terms) == 1:
+                return rows
+        return rows
+
+    async def search(self, board_id: str, query: str, limit: int = 10) -> list:
+        """Searches the open cards of a board by name, description and label names
+
+        Args:
+            board_id (str): ID of the board
+            query (str): words to look for
+            limit (int, optional): maximum number of cards to return. Defaults to 10.
+
+        Returns:
+            list: (card ID, description snippet) pairs, best match first
+        """
+        words = WORD.findall(query)
+        if not words:
+            return []
+        return await self.run(self._search, board_id, words, limit)
+
+    def _close(self):
+        """Closes the database (runs in the store's thread)"""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def close(self):
+        """Waits for pending writes and closes the database"""
+        self.executor.submit(self._close).result()
+        self.executor.shutdown(wait=True)
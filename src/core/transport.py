@@ -0,0 +1,253 @@
+# ---------IMPORTS---------
+import asyncio
+import functools
+import random
+import threading
+import time
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+
+API_URL = "https://api.trello.com/1"
+
+# Trello allows 300 requests per 10 seconds per API key, 100 per token
+RATE_WINDOW = 10.0
+
+# Methods safe to retry after a server error (a retried POST could create twice)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+
+
+# ---------RATE LIMITING----------
+class TokenBucket:
+    """Thread-safe token bucket allowing `limit` requests per `window` seconds.
+
+    Requests may burst up to the limit, then proceed at the sustained rate.
+    """
+
+    def __init__(self, limit: int, window: float = RATE_WINDOW):
+        """Initialise token bucket
+
+        Args:
+            limit (int): requests allowed per window
+            window (float, optional): window length in seconds. Defaults to RATE_WINDOW.
+        """
+        self.capacity = float(limit)
+        self.rate = limit / window
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+        # Set on 429 responses, no token is handed out before this time
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token, sleeping until one is available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stops handing out tokens for a while, e.g. after a 429 response
+
+        Args:
+            seconds (float): seconds to pause for
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+class RateLimitedSession(requests.Session):
+    """requests.Session that paces requests through token buckets and retries
+    429 and 5xx responses with Retry-After or jittered exponential backoff.
+
+    Every request made through the session is limited, including py-trello's.
+    """
+
+    def __init__(self, buckets: list, max_retries: int = 5, backoff: float = 0.5):
+        """Initialise rate-limited session
+
+        Args:
+            buckets (list[TokenBucket]): buckets a request takes a token from, e.g. per key and per token
+            max_retries (int, optional): retries before a 429/5xx response is returned. Defaults to 5.
+            backoff (float, optional): base delay of the exponential backoff in seconds. Defaults to 0.5.
+        """
+        super().__init__()
+        self.buckets = buckets
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def retry_delay(self, response: requests.Response, attempt: int) -> float:
+        """Computes how long to wait before retrying a request
+
+        Args:
+            response (requests.Response): 429 or 5xx response
+            attempt (int): number of the failed attempt, from 0
+
+        Returns:
+            float: delay in seconds
+        """
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.replace(".", "", 1).isdigit():
+            return float(retry_after)
+        # Full jitter keeps concurrent retries from firing in lockstep
+        return random.uniform(0, self.backoff * 2**attempt)
+
+    def request(self, method, url, *args, **kwargs) -> requests.Response:
+        """Sends a request once tokens are available, retrying 429/5xx responses"""
+        for attempt in range(self.max_retries + 1):
+            for bucket in self.buckets:
+                bucket.acquire()
+            response = super().request(method, url, *args, **kwargs)
+
+            throttled = response.status_code == 429
+            failed = (
+                response.status_code >= 500 and method.upper() in IDEMPOTENT_METHODS
+            )
+            if not (throttled or failed) or attempt == self.max_retries:
+                return response
+
+            delay = self.retry_delay(response, attempt)
+            if throttled:
+                # Hold back every other request of the process too
+                for bucket in self.buckets:
+                    bucket.pause(delay)
+            response.close()
+            time.sleep(delay)
+        return response
+
+
+# ---------TRANSPORT----------
+class TrelloTransport:
+    """Shared HTTP layer for the Trello REST API.
+
+    Holds one keep-alive session with a connection pool, so successive calls reuse
+    warm TCP/TLS connections. The session can be handed to py-trello's TrelloClient
+    as its http_service so both share the same pool.
+
+    Blocking calls run in a thread pool the size of the connection pool, so awaiting
+    them never stalls the event loop and at most pool_size requests are in flight.
+    Requests are paced to stay within Trello's per-key and per-token rate limits.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        token: str,
+        pool_size: int = 10,
+        timeout: float = 20,
+        key_limit: int = 300,
+        token_limit: int = 100,
+    ):
+        """Initialise transport
+
+        Args:
+            api_key (str): Trello API key
+            token (str): Trello API token
+            pool_size (int, optional): maximum number of pooled connections. Defaults to 10.
+            timeout (float, optional): seconds before a request times out. Defaults to 20.
+            key_limit (int, optional): requests allowed per 10 seconds for the API key. Defaults to 300.
+            token_limit (int, optional): requests allowed per 10 seconds for the token. Defaults to 100.
+        """
+        self.session = RateLimitedSession(
+            [TokenBucket(key_limit), TokenBucket(token_limit)]
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="trello"
+        )
+
+        # Auth query parameters, resolved once
+        self.auth = {"key": api_key, "token": token}
+
+    async def run(self, function, *args, **kwargs):
+        """Runs a blocking call in the transport's thread pool
+
+        Args:
+            function (callable): blocking function, e.g. a py-trello method
+
+        Returns:
+            Any: return value of the function
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(function, *args, **kwargs)
+        )
+
+    def send(
+        self,
+        method: str,
+        path: str,
+        params: dict | None = None,
+        data: dict | None = None,
+    ) -> requests.Response:
+        """Sends an authenticated request to the Trello API (blocking)
+
+        Args:
+            method (str): HTTP method
+            path (str): API path, e.g. "/cards/<id>"
+            params (dict | None, optional): query parameters. Defaults to None.
+            data (dict | None, optional): form body. Defaults to None.
+
+        Returns:
+            requests.Response: Trello response
+        """
+        query = {**self.auth, **(params or {})}
+        return self.session.request(
+            method, API_URL + path, params=query, data=data, timeout=self.timeout
+        )
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        params: dict | None = None,
+        data: dict | None = None,
+    ) -> requests.Response:
+        """Sends an authenticated request to the Trello API without blocking the loop
+
+        Args:
+            method (str): HTTP method
+            path (str): API path, e.g. "/cards/<id>"
+            params (dict | None, optional): query parameters. Defaults to None.
+            data (dict | None, optional): form body. Defaults to None.
+
+        Returns:
+            requests.Response: Trello response
+        """
+        return await self.run(self.send, method, path, params=params, data=data)
+
+    async def get(self, path: str, params: dict | None = None) -> requests.Response:
+        """Sends a GET request to the Trello API"""
+        return await self.request("GET", path, params=params)
+
+    async def post(
+        self, path: str, params: dict | None = None, data: dict | None = None
+    ) -> requests.Response:
+        """Sends a POST request to the Trello API"""
+        return await self.request("POST", path, params=params, data=data)
+
+    async def put(self, path: str, params: dict | None = None) -> requests.Response:
+        """Sends a PUT request to the Trello API"""
+        return await self.request("PUT", path, params=params)
+
+    async def delete(self, path: str, params: dict | None = None) -> requests.Response:
+        """Sends a DELETE request to the Trello API"""
+        return await self.request("DELETE", path, params=params)
+
+    def close(self):
+        """Waits for in-flight requests and closes the pooled connections"""
+        self.executor.shutdown(wait=True)
+        self.session.close()
@@ -0,0 +1,113 @@
+# ---------IMPORTS---------
+import base64
+import hashlib
+import hmac
+import json
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ---------WEBHOOK RECEIVER----------
+class WebhookReceiver:
+    """Local HTTP receiver for Trello webhook payloads.
+
+    Runs in a background thread and hands each action to a callback on the event
+    loop. Recorded payloads can be replayed by POSTing them to the receiver.
+    """
+
+    def __init__(
+        self,
+        on_action,
+        loop,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        secret: str | None = None,
+        callback_url: str | None = None,
+    ):
+        """Initialise webhook receiver
+
+        Args:
+            on_action (Callable[[dict], None]): called on the event loop with each webhook action
+            loop (asyncio.AbstractEventLoop): event loop the callback runs on
+            host (str, optional): interface to listen on. Defaults to "127.0.0.1".
+            port (int, optional): port to listen on. Defaults to 8765.
+            secret (str | None, optional): Trello API secret, used to verify payload signatures. Defaults to None (no verification).
+            callback_url (str | None, optional): public URL Trello posts to, part of the signed content. Defaults to None.
+        """
+        self.on_action = on_action
+        self.loop = loop
+        self.secret = secret
+        self.callback_url = callback_url
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="trello-webhook", daemon=True
+        )
+
+    def verify(self, body: bytes, signature: str | None) -> bool:
+        """Checks the X-Trello-Webhook signature of a payload
+
+        Args:
+            body (bytes): raw request body
+            signature (str | None): value of the X-Trello-Webhook header
+
+        Returns:
+            bool: True if the signature matches, or if verification is disabled
+        """
+        if not (self.secret and self.callback_url):
+            return True
+        digest = hmac.new(
+            self.secret.encode(),
+            body + self.callback_url.encode(),
+            hashlib.sha1,
+        ).digest()
+        expected = base64.b64encode(digest).decode()
+        return signature is not None and hmac.compare_digest(expected, signature)
+
+    def receive(self, payload: dict):
+        """Schedules the action of a payload on the event loop
+
+        Args:
+            payload (dict): decoded webhook payload
+        """
+        self.loop.call_soon_threadsafe(self.on_action, payload["action"])
+
+    def _handler(self):
+        """Builds the request handler class bound to this receiver
+
+        Returns:
+            type: BaseHTTPRequestHandler subclass
+        """
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                # Trello checks the callback URL with a HEAD request on registration
+                self.send_response(200)
+                self.end_headers()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not receiver.verify(body, self.headers.get("X-Trello-Webhook")):
+                    self.send_response(401)
+                    self.end_headers()
+                    return
+                try:
+                    receiver.receive(json.loads(body))
+                except (ValueError, KeyError):
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.end_headers()
+
+        return Handler
+
+    def start(self):
+        """Starts serving in the background"""
+        self.thread.start()
+
+    def stop(self):
+        """Stops serving"""
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,42 +1,122 @@
+import math
 import re
-from PyQt6.QtWidgets import QLabel, QSizePolicy
-from PyQt6.QtCore import Qt, QTimer
+from asyncio import Future
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+
+# ----------FORMATTING-----------
+# [Called tool ...] logs
+CALLED_TOOL = re.compile(r"\[Called tool ([^\]]+)\]")
+
+# Links given as "Description of link (link)"
+URL = re.compile(r"\((https?://[^\s]+)\)")
+
+# Places the formatted HTML can be cut while typing it out: after whitespace or a
+# line break, but never inside a tag
+CUT = re.compile(r"(?:<br>|\s)+(?![^<]*>)")
+
+# Interval between two repaints of a bubble, about 30 frames per second
+FRAME_MS = 33
+
+# Typed out messages are fully displayed within this time, whatever their length
+REVEAL_MS = 1500
+
+# Messages longer than this are displayed at once instead of being typed out
+INSTANT_CHARS = 2000
 
 
 # ----------CHAT BUBBLE-----------
-class ChatBubble(QLabel):
-    """Chat Bubble class for displaying messages in window
+class ChatBubble(QObject):
+    """Chat Bubble class for messages displayed in window
+
+    A bubble is a row of the chat history model. It holds the HTML currently
+    displayed and emits changed when it grows; the chat view paints it.
+
+    Text is formatted into HTML once, then typed out a few words per frame, so the
+    cost of displaying a message grows linearly with its length.
 
     Args:
-        QLabel (class): displays text
+        QObject (class): emits changes to the chat view
     """
 
-    def __init__(self, full_text, is_user=False, on_done=None):
+    # Emitted when the displayed text changes
+    changed = pyqtSignal()
+
+    def __init__(
+        self, full_text, is_user=False, on_done=None, streaming=False, instant=None
+    ):
         """Initializes chat bubble
 
         Args:
             full_text (str): text displayed in final bubble
             is_user (bool, optional): differentiates agent and user chat bubbles (colour). Defaults to False.
+            streaming (bool, optional): text arrives through append_text() instead of being typed out. Defaults to False.
+            instant (bool | None, optional): display the text at once instead of typing it out. Defaults to None (only for texts longer than INSTANT_CHARS).
         """
         super().__init__()
         self.full_text = full_text
-        self.displayed_text = ""
+        self.streaming = streaming
+        self.is_user = is_user
+        self.sender = "User" if is_user else "Dave"
+        self.colour = "#ca66a0" if is_user else "#747bda"
+
+        # Displayed HTML, and a counter bumped on each change so views can cache layouts
+        self.displayed = ""
+        self.version = 0
+
+        # Formatted text and the offsets it is typed out at, computed once
+        self.html = self.format_brackets(full_text)
+        if instant is None:
+            instant = len(full_text) > INSTANT_CHARS
+        self.cuts = [] if instant else [cut.end() for cut in CUT.finditer(self.html)]
+        self.cuts.append(len(self.html))
         self.index = 0
-        self.setWordWrap(True)
-        colour = "#ca66a0" if is_user else "#747bda"
-        radius = "10px 10px 0px 10px" if is_user else "10px 10px 10px 0px"
-        self.setStyleSheet(
-            f"padding: 10px; margin: 5px; border-radius: {radius}; background-color: {colour};"
-            "max-width: 600px;"  # Limit bubble width for readability
-        )
-        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Maximum)
-        self.setTextFormat(Qt.TextFormat.RichText)  # Enable HTML formatting
-        self.setOpenExternalLinks(True)  # <-- This makes links open in browser
-        self.timer = QTimer()
+        # Cuts revealed per frame, so any message is typed out within REVEAL_MS
+        self.step = math.ceil(len(self.cuts) / (REVEAL_MS / FRAME_MS))
+
+        # Streamed text waiting to be displayed on the next frame
+        self.dirty = False
+
+        self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_text)
-        self.timer.start(20)  # Adjust for speed
+        if not streaming:
+            self.timer.start(FRAME_MS)
         self.on_done = on_done
-        self.done = False
+
+        # Resolved once the whole text is displayed, await it instead of polling
+        self.completed: Future[None] = Future()
+
+    @property
+    def done(self) -> bool:
+        """Whether the whole text is displayed"""
+        return self.completed.done()
+
+    def complete(self):
+        """Marks the bubble as fully displayed and wakes whoever awaits it"""
+        # Only the displayed HTML is kept once typed out, so long histories stay cheap
+        self.html = ""
+        self.cuts = []
+        if not self.completed.done():
+            self.completed.set_result(None)
+        self.on_done(progressive=False)  # Call on_done with final scroll
+
+    def text(self) -> str:
+        """Returns the displayed text
+
+        Returns:
+            str: displayed HTML
+        """
+        return self.displayed
+
+    def setText(self, html: str):
+        """Displays HTML in the bubble
+
+        Args:
+            html (str): HTML to display
+        """
+        self.displayed = html
+        self.version += 1
+        self.changed.emit()
 
     def format_brackets(self, text) -> str:
         """Uses HTML to format text before displaying it on the window
@@ -49,8 +129,7 @@ class ChatBubble(QLabel):
         """
 
         # Style [Called tool ...] with italic font weight
-        called_tool = re.sub(
-            r"\[Called tool ([^\]]+)\]",
+        called_tool = CALLED_TOOL.sub(
             r'<span style="color:#fff; font-style:italic;">[Called tool \1]</span>',
             text,
         )
@@ -59,9 +138,7 @@ class ChatBubble(QLabel):
         no_stars = called_tool.replace("**", "")
 
         # Make url's clickable "(here)"
-        url_pattern = r"\((https?://[^\s]+)\)"
-        links = re.sub(
-            url_pattern,
+        links = URL.sub(
             r'(<a href="\1" style="color:#ca66a0; text-decoration:underline;">here</a>)',
             no_stars,
         )
@@ -71,17 +148,40 @@ class ChatBubble(QLabel):
         return html_text
 
     def update_text(self):
-        """Progressively updates the text in the bubble"""
-        if self.index < len(self.full_text):
-            self.displayed_text += self.full_text[self.index]
-            formatted = self.format_brackets(self.displayed_text)
-            self.setText(formatted)
-            self.index += 1
+        """Displays the next words of the bubble, or the latest streamed text"""
+        if self.streaming:
+            if self.dirty:
+                self.dirty = False
+                self.setText(self.format_brackets(self.full_text))
+                self.on_done(progressive=True)
+            return
+
+        self.index = min(self.index + self.step, len(self.cuts))
+        self.setText(self.html[: self.cuts[self.index - 1]])
+        if self.index < len(self.cuts):
             # Call on_done with progressive scroll
             self.on_done(progressive=True)
         else:
             self.timer.stop()
-            formatted = self.format_brackets(self.displayed_text)
-            self.setText(formatted)
-            self.done = True
-            self.on_done(progressive=False)  # Call on_done with final scroll
+            self.complete()
+
+    def append_text(self, chunk: str):
+        """Appends streamed text to the bubble, displayed on the next frame at most
+
+        Args:
+            chunk (str): text delta to append
+        """
+        self.full_text += chunk
+        if self.timer.isActive():
+            self.dirty = True
+            return
+        # First chunk, display it right away and repaint on frames from now on
+        self.setText(self.format_brackets(self.full_text))
+        self.on_done(progressive=True)
+        self.timer.start(FRAME_MS)
+
+    def finish(self):
+        """Marks a streamed bubble as complete"""
+        self.timer.stop()
+        self.setText(self.format_brackets(self.full_text.rstrip("\n")))
+        self.complete()
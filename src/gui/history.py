@@ -0,0 +1,487 @@
+from collections import OrderedDict
+from PyQt6.QtWidgets import (
+    QAbstractScrollArea,
+    QStyledItemDelegate,
+    QStyleOptionViewItem,
+)
+from PyQt6.QtCore import (
+    Qt,
+    QAbstractListModel,
+    QModelIndex,
+    QPointF,
+    QRect,
+    QRectF,
+    QSize,
+    QUrl,
+)
+from PyQt6.QtGui import (
+    QColor,
+    QDesktopServices,
+    QFont,
+    QPainter,
+    QPainterPath,
+    QPalette,
+    QTextDocument,
+    QAbstractTextDocumentLayout,
+)
+
+
+# ----------LAYOUT-----------
+# Space around a bubble, inside a bubble, and between the name and its bubble
+MARGIN = 5
+PADDING = 10
+SPACING = 2
+
+# Widest a bubble gets, padding included
+MAX_BUBBLE_WIDTH = 600
+
+RADIUS = 10
+
+# Laid out bubble texts kept between paints, enough for a few screens of history
+DOCUMENT_CACHE = 256
+
+# Role returning the ChatBubble of a row
+BubbleRole = Qt.ItemDataRole.UserRole
+
+
+# ----------ROW HEIGHTS-----------
+class RowHeights:
+    """Heights of the rows of the chat history, with the offset of each row.
+
+    A Fenwick tree keeps both changing a height and finding the row at an offset
+    logarithmic in the number of rows, so a growing bubble never requires laying
+    out the whole history again.
+    """
+
+    def __init__(self):
+        """Initialise empty heights"""
+        self.heights: list[int] = []
+        self.tree: list[int] = [0]
+        self.total = 0
+
+    def __len__(self) -> int:
+        """Returns the number of rows"""
+        return len(self.heights)
+
+    def append(self, height: int):
+        """Adds a row at the end
+
+        Args:
+            height (int): height of the row in pixels
+        """
+        self.heights.append(height)
+        i = len(self.heights)
+        # The new node covers rows (i - lowbit(i), i], sum them from the tree
+        node = height
+        child = i - 1
+        while child > i - (i & -i):
+            node += self.tree[child]
+            child -= child & -child
+        self.tree.append(node)
+        self.total += height
+
+    def set(self, row: int, height: int):
+        """Changes the height of a row
+
+        Args:
+            row (int): index of the row
+            height (int): new height in pixels
+        """
+        delta = height - self.heights[row]
+        if not delta:
+            return
+        self.heights[row] = height
+        self.total += delta
+        i = row + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def offset(self, row: int) -> int:
+        """Returns the offset of the top of a row
+
+        Args:
+            row (int): index of the row
+
+        Returns:
+            int: sum of the heights of the rows above
+        """
+        offset = 0
+        while row > 0:
+            offset += self.tree[row]
+            row -= row & -row
+        return offset
+
+    def row_at(self, offset: int) -> int:
+        """Returns the row covering an offset
+
+        Args:
+            offset (int): offset in pixels from the top of the history
+
+        Returns:
+            int: index of the row, len(self) if the offset is past the last row
+        """
+        row = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            if row + step < len(self.tree) and self.tree[row + step] <= offset:
+                row += step
+                offset -= self.tree[row]
+            step >>= 1
+        return row
+
+
+# ----------CHAT MODEL-----------
+class ChatModel(QAbstractListModel):
+    """List model of the chat history, one ChatBubble per row"""
+
+    def __init__(self):
+        """Initialise empty history"""
+        super().__init__()
+        self.bubbles = []
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        """Returns the number of bubbles in the history"""
+        return 0 if parent.isValid() else len(self.bubbles)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        """Returns the displayed text or the ChatBubble of a row"""
+        bubble = self.bubbles[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return bubble.text()
+        if role == BubbleRole:
+            return bubble
+        return None
+
+    def add(self, bubble):
+        """Appends a bubble to the history and follows its updates
+
+        Args:
+            bubble (ChatBubble): bubble to append
+        """
+        row = len(self.bubbles)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.bubbles.append(bubble)
+        self.endInsertRows()
+        bubble.changed.connect(
+            lambda: self.dataChanged.emit(self.index(row), self.index(row))
+        )
+
+
+# ----------CHAT DELEGATE-----------
+class ChatDelegate(QStyledItemDelegate):
+    """Paints a row of the chat history: the sender's name above their bubble"""
+
+    def __init__(self, parent=None):
+        """Initialise delegate
+
+        Args:
+            parent (QObject, optional): owner of the delegate. Defaults to None.
+        """
+        super().__init__(parent)
+        # Laid out texts keyed by bubble, bubble version and text width
+        self.documents: OrderedDict[tuple, QTextDocument] = OrderedDict()
+
+    def document(self, bubble, width: int, font: QFont) -> QTextDocument:
+        """Returns the text of a bubble laid out for a width
+
+        Args:
+            bubble (ChatBubble): bubble to lay out
+            width (int): widest the text may be
+            font (QFont): default font of the text
+
+        Returns:
+            QTextDocument: text, narrowed to its content for short messages
+        """
+        key = (id(bubble), bubble.version, width)
+        document = self.documents.get(key)
+        if document is not None:
+            self.documents.move_to_end(key)
+            return document
+
+        document = QTextDocument()
+        document.setDefaultFont(font)
+        document.setDocumentMargin(0)
+        document.setHtml(bubble.text())
+        document.setTextWidth(width)
+        ideal = document.idealWidth()
+        if ideal < width:
+            document.setTextWidth(ideal)
+
+        self.documents[key] = document
+        if len(self.documents) > DOCUMENT_CACHE:
+            self.documents.popitem(last=False)
+        return document
+
+    @staticmethod
+    def text_width(row_width: int) -> int:
+        """Returns the widest a bubble's text may be in a row
+
+        Args:
+            row_width (int): width of the row
+
+        Returns:
+            int: text width in pixels
+        """
+        bubble_width = min(MAX_BUBBLE_WIDTH, row_width - 2 * MARGIN)
+        return max(bubble_width - 2 * PADDING, 1)
+
+    @staticmethod
+    def name_font(font: QFont) -> QFont:
+        """Returns the font of sender names
+
+        Args:
+            font (QFont): font of the view
+
+        Returns:
+            QFont: bold font
+        """
+        bold = QFont(font)
+        bold.setBold(True)
+        return bold
+
+    def layout(self, option, index) -> tuple:
+        """Lays out a row
+
+        Args:
+            option (QStyleOptionViewItem): row rectangle and font
+            index (QModelIndex): index of the row
+
+        Returns:
+            tuple: bubble, laid out text, height of the name line, and bubble rectangle relative to the row
+        """
+        bubble = index.data(BubbleRole)
+        document = self.document(
+            bubble, self.text_width(option.rect.width()), option.font
+        )
+        name_height = option.fontMetrics.height()
+        width = int(document.textWidth()) + 2 * PADDING
+        height = int(document.size().height()) + 2 * PADDING
+        x = option.rect.width() - MARGIN - width if bubble.is_user else MARGIN
+        rect = QRect(x, name_height + SPACING + MARGIN, width, height)
+        return bubble, document, name_height, rect
+
+    def sizeHint(self, option, index) -> QSize:
+        """Returns the size of a row laid out at the option's width"""
+        _, _, _, rect = self.layout(option, index)
+        return QSize(option.rect.width(), rect.bottom() + 1 + MARGIN)
+
+    def paint(self, painter, option, index):
+        """Paints the sender's name and bubble of a row"""
+        bubble, document, name_height, rect = self.layout(option, index)
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.translate(option.rect.topLeft())
+
+        # Name label above bubble
+        painter.setFont(self.name_font(option.font))
+        painter.setPen(QColor(bubble.colour))
+        alignment = (
+            Qt.AlignmentFlag.AlignRight
+            if bubble.is_user
+            else Qt.AlignmentFlag.AlignLeft
+        )
+        painter.drawText(
+            QRect(MARGIN, 0, option.rect.width() - 2 * MARGIN, name_height),
+            alignment,
+            bubble.sender,
+        )
+
+        # Bubble, with a square corner on the sender's side at the bottom
+        path = QPainterPath()
+        path.addRoundedRect(QRectF(rect), RADIUS, RADIUS)
+        corner_x = rect.right() + 1 - RADIUS if bubble.is_user else rect.left()
+        path.addRect(QRectF(corner_x, rect.bottom() + 1 - RADIUS, RADIUS, RADIUS))
+        path.setFillRule(Qt.FillRule.WindingFill)
+        painter.fillPath(path, QColor(bubble.colour))
+
+        # Text
+        painter.translate(rect.left() + PADDING, rect.top() + PADDING)
+        context = QAbstractTextDocumentLayout.PaintContext()
+        context.palette.setColor(QPalette.ColorRole.Text, QColor("#fff"))
+        document.documentLayout().draw(painter, context)
+        painter.restore()
+
+    def anchor_at(self, option, index, point) -> str:
+        """Returns the link under a point of a row
+
+        Args:
+            option (QStyleOptionViewItem): row rectangle and font
+            index (QModelIndex): index of the row
+            point (QPoint): point relative to the row
+
+        Returns:
+            str: URL of the link, empty if there is none
+        """
+        _, document, _, rect = self.layout(option, index)
+        position = QPointF(point - rect.topLeft()) - QPointF(PADDING, PADDING)
+        return document.documentLayout().anchorAt(position)
+
+
+# ----------CHAT VIEW-----------
+class ChatView(QAbstractScrollArea):
+    """Virtualised view of the chat history.
+
+    Only the rows in sight are laid out and painted. Heights of rows never seen
+    at the current width are estimates until they scroll into sight, so resizing
+    the window or growing a bubble costs the same whatever the length of the
+    history.
+    """
+
+    def __init__(self, parent=None):
+        """Initialise view
+
+        Args:
+            parent (QWidget, optional): parent widget. Defaults to None.
+        """
+        super().__init__(parent)
+        self.model: ChatModel | None = None
+        self.delegate = ChatDelegate(self)
+        self.heights = RowHeights()
+        # Viewport width each row was last measured at
+        self.measured: list[int] = []
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.verticalScrollBar().setSingleStep(20)
+        self.viewport().setMouseTracking(True)
+
+    def setModel(self, model: ChatModel):
+        """Shows a chat model
+
+        Args:
+            model (ChatModel): history to show
+        """
+        self.model = model
+        model.rowsInserted.connect(self.on_rows_inserted)
+        model.dataChanged.connect(self.on_data_changed)
+
+    def option(self, row: int) -> QStyleOptionViewItem:
+        """Builds the style option of a row
+
+        Args:
+            row (int): index of the row
+
+        Returns:
+            QStyleOptionViewItem: option with the row's rectangle in viewport coordinates
+        """
+        option = QStyleOptionViewItem()
+        option.initFrom(self.viewport())
+        option.font = self.font()
+        top = self.heights.offset(row) - self.verticalScrollBar().value()
+        option.rect = QRect(0, top, self.viewport().width(), self.heights.heights[row])
+        return option
+
+    def measure(self, row: int):
+        """Lays out a row at the current width and records its height
+
+        Args:
+            row (int): index of the row
+        """
+        option = self.option(row)
+        height = self.delegate.sizeHint(option, self.model.index(row)).height()
+        self.heights.set(row, height)
+        self.measured[row] = self.viewport().width()
+
+    def update_scroll_range(self):
+        """Fits the scroll bar to the height of the history"""
+        scrollbar = self.verticalScrollBar()
+        page = self.viewport().height()
+        scrollbar.setPageStep(page)
+        scrollbar.setRange(0, max(0, self.heights.total - page))
+
+    def on_rows_inserted(self, parent, first: int, last: int):
+        """Measures the bubbles appended to the history"""
+        for row in range(first, last + 1):
+            self.heights.append(0)
+            self.measured.append(0)
+            self.measure(row)
+        self.update_scroll_range()
+        self.viewport().update()
+
+    def on_data_changed(self, top_left, bottom_right, roles=()):
+        """Measures bubbles again after their text changed"""
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            self.measure(row)
+        self.update_scroll_range()
+        self.viewport().update()
+
+    def resizeEvent(self, event):
+        """Fits the scroll range to the new height
+
+        Rows are measured again as they come into sight, the others keep their old
+        height as an estimate.
+        """
+        super().resizeEvent(event)
+        self.update_scroll_range()
+
+    def scrollContentsBy(self, dx: int, dy: int):
+        """Repaints the rows in sight after scrolling"""
+        self.viewport().update()
+
+    def paintEvent(self, event):
+        """Paints the rows in sight, measuring those not yet laid out at this width"""
+        if self.model is None or not len(self.heights):
+            return
+        painter = QPainter(self.viewport())
+        width = self.viewport().width()
+        top = self.verticalScrollBar().value()
+        bottom = top + self.viewport().height()
+
+        row = self.heights.row_at(top)
+        remeasured = False
+        while row < len(self.heights) and self.heights.offset(row) < bottom:
+            if self.measured[row] != width:
+                self.measure(row)
+                remeasured = True
+            self.delegate.paint(painter, self.option(row), self.model.index(row))
+            row += 1
+        painter.end()
+
+        if remeasured:
+            self.update_scroll_range()
+
+    def row_at(self, point) -> int | None:
+        """Returns the row under a point of the viewport
+
+        Args:
+            point (QPoint): point in viewport coordinates
+
+        Returns:
+            int | None: index of the row, None below the last row
+        """
+        row = self.heights.row_at(point.y() + self.verticalScrollBar().value())
+        return row if row < len(self.heights) else None
+
+    def anchor_at(self, point) -> str:
+        """Returns the link under a point of the viewport
+
+        Args:
+            point (QPoint): point in viewport coordinates
+
+        Returns:
+            str: URL of the link, empty if there is none
+        """
+        row = self.row_at(point)
+        if row is None:
+            return ""
+        option = self.option(row)
+        return self.delegate.anchor_at(
+            option, self.model.index(row), point - option.rect.topLeft()
+        )
+
+    def mouseMoveEvent(self, event):
+        """Shows a pointing hand over links"""
+        over_link = bool(self.anchor_at(event.position().toPoint()))
+        self.viewport().setCursor(
+            Qt.CursorShape.PointingHandCursor
+            if over_link
+            else Qt.CursorShape.ArrowCursor
+        )
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        """Opens clicked links in the browser"""
+        anchor = self.anchor_at(event.position().toPoint())
+        if anchor and event.button() == Qt.MouseButton.LeftButton:
+            QDesktopServices.openUrl(QUrl(anchor))
+        super().mouseReleaseEvent(event)
@@ -1,18 +1,18 @@
 from PyQt6.QtWidgets import (
     QWidget,
     QVBoxLayout,
-    QScrollArea,
     QLineEdit,
     QPushButton,
     QLabel,
-    QSizePolicy,
-    QHBoxLayout,
 )
 from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QIcon
+from PyQt6.QtGui import QIcon, QKeySequence, QShortcut
 import asyncio
+import os
 from .consent import ConsentDialog
 from .bubble import ChatBubble
+from .history import ChatModel, ChatView
+from core.scheduler import QueryScheduler
 
 from qasync import asyncSlot
 
@@ -50,18 +50,30 @@ class ChatWindow(QWidget):
 
         self.client = client
 
+        # Queries in flight, run according to QUERY_POLICY (serial, parallel or cancel)
+        self.scheduler = QueryScheduler(
+            os.getenv("QUERY_POLICY", "serial"), on_change=self.update_status
+        )
+
         # Layout
         self.layout = QVBoxLayout(self)
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
 
-        self.chat_container = QWidget()
-        self.chat_layout = QVBoxLayout(self.chat_container)
-        self.chat_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
-
-        self.scroll_area.setWidget(self.chat_container)
+        # Chat history, only the bubbles in sight are laid out and painted
+        self.history = ChatModel()
+        self.scroll_area = ChatView()
+        self.scroll_area.setModel(self.history)
         self.layout.addWidget(self.scroll_area)
 
+        # Progress of the queries in flight, hidden when there are none
+        self.status = QLabel(self)
+        self.status.setStyleSheet("color: #888; font-size: 12px;")
+        self.status.setWordWrap(True)
+        self.status.hide()
+        self.layout.addWidget(self.status)
+
+        # Escape cancels the latest query
+        QShortcut(QKeySequence(Qt.Key.Key_Escape), self, self.scheduler.cancel_latest)
+
         # User input
         self.line = QLineEdit(self)
         self.layout.addWidget(self.line)
@@ -95,6 +107,9 @@ class ChatWindow(QWidget):
         """)
 
         self.scroll_area.setStyleSheet("""
+            QAbstractScrollArea {
+                border: none;
+            }
             QScrollBar:vertical {
                 background: #1a1a1a;
                 width: 10px;
@@ -115,6 +130,20 @@ class ChatWindow(QWidget):
             }
         """)
 
+    def update_status(self):
+        """Shows what each query in flight is doing"""
+        if not self.scheduler.requests:
+            self.status.hide()
+            return
+        lines = []
+        for request in self.scheduler.requests:
+            query = (
+                request.query if len(request.query) <= 40 else request.query[:39] + "…"
+            )
+            lines.append(f'"{query}": {request.status}')
+        self.status.setText("\n".join(lines) + "\n(Esc cancels the latest query)")
+        self.status.show()
+
     def scroll_to_bottom(self, progressive=False):
         """Manages window scrolling
 
@@ -142,32 +171,10 @@ class ChatWindow(QWidget):
         # Display message
         self.line.clear()
         user_bubble = ChatBubble(text, is_user=True, on_done=self.scroll_to_bottom)
+        self.history.add(user_bubble)
 
-        # Name label above bubble
-        name_label = QLabel("User")
-        name_label.setStyleSheet("color: #ca66a0; font-weight: bold;")
-        name_label.setAlignment(Qt.AlignmentFlag.AlignRight)
-
-        # Vertical layout for name above bubble
-        v_layout = QVBoxLayout()
-        v_layout.addWidget(name_label)
-        v_layout.addWidget(user_bubble)
-        v_layout.setSpacing(2)
-        v_layout.setContentsMargins(0, 0, 0, 0)
-
-        # Horizontal layout for alignment
-        container = QWidget()
-        h_layout = QHBoxLayout(container)
-        h_layout.addStretch()  # Push to right
-        h_layout.addLayout(v_layout)
-        h_layout.setContentsMargins(0, 0, 0, 0)
-        container.setSizePolicy(
-            QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Maximum
-        )
-        self.chat_layout.addWidget(container)
-        while user_bubble.done is False:
-            await asyncio.sleep(0.01)  # Allow GUI to update
-        await self.handle_query(text)  # Process query
+        # Process query while the message is typed out, reply once it is displayed
+        await self.handle_query(text, after=user_bubble.completed)
 
     async def ask_user_consent(self, message: str) -> str:
         """Displays user consent dialog box
@@ -180,49 +187,78 @@ class ChatWindow(QWidget):
         """
         dialog = ConsentDialog(message)
         dialog.show()
-        return await dialog.result
+        try:
+            return await dialog.result
+        except asyncio.CancelledError:
+            dialog.close()  # The query was cancelled, nothing left to consent to
+            raise
 
-    async def handle_query(self, query: str):
+    async def handle_query(self, query: str, after: asyncio.Future | None = None):
         """Launch process query and display result in chat window
 
         Args:
             query (str): user query
+            after (asyncio.Future | None, optional): display the reply only once this is done. Defaults to None.
         """
+        request = self.scheduler.submit(
+            query,
+            lambda request: self.receive_message(
+                self.client.stream_query(query, progress=request.report), after=after
+            ),
+        )
         try:
-            response = await self.client.process_query(query)
-            await self.receive_message(response)
+            await request.task
+        except asyncio.CancelledError:
+            if not request.task.cancelled():
+                raise  # This handler itself is being cancelled, not the query
+            if request.superseded:
+                await self.receive_message(
+                    "Dave stopped working on your previous request to handle the new one."
+                )
+            else:
+                await self.receive_message("Dave stopped working on your request.")
         except Exception as e:
             await self.receive_message(f"Error: {e}")
 
-    async def receive_message(self, response):
+    async def receive_message(self, response, after: asyncio.Future | None = None):
         """Display message by agent
 
         Args:
-            response (str): result from user query processing
+            response (str | AsyncIterator[str]): result from user query processing, or its text deltas as they are generated
+            after (asyncio.Future | None, optional): display the message only once this is done. Defaults to None.
         """
-
-        # Formatting
-        text = response
-
-        # Create bubble
-        ai_bubble = ChatBubble(text, on_done=self.scroll_to_bottom)
-
-        name_label = QLabel("Dave")
-        name_label.setStyleSheet("color: #747bda; font-weight: bold;")
-        name_label.setAlignment(Qt.AlignmentFlag.AlignLeft)
-
-        v_layout = QVBoxLayout()
-        v_layout.addWidget(name_label)
-        v_layout.addWidget(ai_bubble)
-        v_layout.setSpacing(2)
-        v_layout.setContentsMargins(0, 0, 0, 0)
-
-        container = QWidget()
-        h_layout = QHBoxLayout(container)
-        h_layout.addLayout(v_layout)
-        h_layout.addStretch()  # Push to left
-        h_layout.setContentsMargins(0, 0, 0, 0)
-        container.setSizePolicy(
-            QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Maximum
-        )
-        self.chat_layout.addWidget(container)
+        streaming = not isinstance(response, str)
+
+        # Start generating the reply right away, the first delta waits for the display
+        first = None
+        if after is not None:
+            if streaming:
+                first = asyncio.ensure_future(anext(response, None))
+            try:
+                await asyncio.shield(after)
+            except BaseException:
+                if first is not None:
+                    first.cancel()
+                raise
+
+        # Create bubble, typed out for plain text
+        if not streaming:
+            self.history.add(ChatBubble(response, on_done=self.scroll_to_bottom))
+            return
+
+        # Streams get their bubble with their first delta, so a stream cancelled
+        # before it leaves no empty bubble behind
+        ai_bubble = None
+        try:
+            chunk = await (first if first is not None else anext(response, None))
+            while chunk is not None:
+                if ai_bubble is None:
+                    ai_bubble = ChatBubble(
+                        "", on_done=self.scroll_to_bottom, streaming=True
+                    )
+                    self.history.add(ai_bubble)
+                ai_bubble.append_text(chunk)
+                chunk = await anext(response, None)
+        finally:
+            if ai_bubble is not None:
+                ai_bubble.finish()
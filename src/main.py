@@ -1,27 +1,66 @@
 # -----------IMPORTS-----------
-import asyncio
-from qasync import QEventLoop
-from PyQt6.QtWidgets import QApplication
 import sys
-from gui.window import ChatWindow
+import time
 
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-from core.client import MCPClient
+# Launch time, taken before the heavier imports below
+STARTED = time.perf_counter()
+
+# Imported after STARTED on purpose, so --profile-startup counts them
+import asyncio  # noqa: E402
+import importlib  # noqa: E402
+from contextlib import AsyncExitStack  # noqa: E402
+from qasync import QEventLoop  # noqa: E402
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+
+from mcp import ClientSession, StdioServerParameters  # noqa: E402
+from mcp.client.stdio import stdio_client  # noqa: E402
+
+
+# Print when each startup step completes, with --profile-startup
+PROFILE_STARTUP = "--profile-startup" in sys.argv
+
+
+def mark(step: str):
+    """Prints the time elapsed since launch when profiling startup
+
+    Args:
+        step (str): startup step just completed
+    """
+    if PROFILE_STARTUP:
+        elapsed = (time.perf_counter() - STARTED) * 1000
+        print(f"[startup] {step}: {elapsed:.0f} ms", file=sys.stderr)
 
 
 async def main():
-    """Connects to MCP server, updates GUI and handles user queries."""
-    # Session manager
-    from contextlib import AsyncExitStack
+    """Connects to MCP server, updates GUI and handles user queries.
+
+    The server is spawned first, so it starts up while the window is built. The
+    window takes queries right away, and they wait for the session if it is not
+    ready yet.
+    """
+    mark("imports done")
 
     # Creation of session scope
     async with AsyncExitStack() as exit_stack:
-        # Initialise client and GUI
+        # Collect server parameters
+        server_params = StdioServerParameters(
+            command="python", args=["core/server.py"], env=None
+        )
+
+        # Launch server
+        stdio, write = await exit_stack.enter_async_context(stdio_client(server_params))
+        mark("server spawned")
+
+        # Initialise client and GUI while the server starts
+        from gui.window import ChatWindow
+        from core.client import MCPClient
+
         client = MCPClient(exit_stack)
         window = ChatWindow(client)
         window.show()
         client.window = window
+        window.line.setPlaceholderText("Connecting to Dave, you can already type...")
+        mark("window shown")
 
         quit_future = asyncio.get_event_loop().create_future()
 
@@ -34,42 +73,55 @@ async def main():
         try:
             # Connect to server
 
-            # Collect server parameters
-            server_params = StdioServerParameters(
-                command="python", args=["core/server.py"], env=None
-            )
-
-            # Launch server
-            stdio_transport = await exit_stack.enter_async_context(
-                stdio_client(server_params)
+            # Format in MCP
+            session = await exit_stack.enter_async_context(
+                ClientSession(stdio, write, message_handler=client.handle_message)
             )
 
-            # Load read and write channels
-            stdio, write = stdio_transport
+            client.session = session
 
-            # Format in MCP
-            session = await exit_stack.enter_async_context(ClientSession(stdio, write))
+            try:
+                # Initialise session
+                await session.initialize()
+                mark("session initialised")
+
+                # Collect tools
+                tools = await client.load_tools()
+                mark("tools listed")
+            except Exception as e:
+                # Fail the queries waiting for the session too
+                client.connected.set_exception(e)
+                raise
+            client.connected.set_result(None)
+            window.line.setPlaceholderText("")
+
+            # Import the LLM client off the event loop, ahead of the first query
+            preload = asyncio.get_running_loop().run_in_executor(
+                None, importlib.import_module, "openai"
+            )
 
-            client.session = session
+            def on_preloaded(future):
+                if not future.cancelled() and future.exception() is not None:
+                    # The first query imports it again and reports the error
+                    print(
+                        f"Error: could not import openai: {future.exception()}",
+                        file=sys.stderr,
+                    )
 
-            # Initialise session
-            await session.initialize()
+            preload.add_done_callback(on_preloaded)
 
-            # Collect tools
-            response = await session.list_tools()
-            tools = response.tools
             text = "Connected to server with tools:\n"
-            for tool in tools:
-                if "[prompt]" not in tool.description.lower():
-                    text += f"-{tool.name}\n"
+            for name, tool in tools.items():
+                if not tool["is_prompt"] and not tool["is_internal"]:
+                    text += f"-{name}\n"
 
             # Collect prompts
             prompts = False
             text_prompts = "\nWith the following prompts:\n"
-            for tool in tools:
-                if "[prompt]" in tool.description.lower():
+            for name, tool in tools.items():
+                if tool["is_prompt"] and not tool["is_internal"]:
                     prompts = True
-                    text_prompts += f"-{tool.name}\n"
+                    text_prompts += f"-{name}\n"
             if not prompts:
                 text_prompts = ""
 
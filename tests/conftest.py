@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Server modules import each other as siblings, as when run from src/core
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "core"))
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import transport
+from transport import TrelloTransport
+
+
+DELAY = 0.3
+CALLS = 5
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """Stub Trello API answering every PUT after DELAY seconds"""
+
+    def do_PUT(self):
+        time.sleep(DELAY)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_put_calls_overlap(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(transport, "API_URL", f"http://127.0.0.1:{server.server_port}")
+    trello = TrelloTransport(api_key="key", token="token", pool_size=CALLS)
+
+    async def put_all():
+        return await asyncio.gather(
+            *(trello.put(f"/cards/{i}", params={"pos": "top"}) for i in range(CALLS))
+        )
+
+    try:
+        start = time.perf_counter()
+        responses = asyncio.run(put_all())
+        elapsed = time.perf_counter() - start
+    finally:
+        trello.close()
+        server.shutdown()
+        server.server_close()
+
+    assert [response.status_code for response in responses] == [200] * CALLS
+    # Overlapping calls take about one delay, sequential ones CALLS delays
+    assert elapsed < 2 * DELAY
@@ -0,0 +1,111 @@
+import asyncio
+import urllib.request
+from pathlib import Path
+
+from board import BoardCache
+from webhook import WebhookReceiver
+
+
+PAYLOADS = Path(__file__).parent / "payloads"
+
+
+def card(card_id: str, name: str, list_id: str, pos: int) -> dict:
+    return {
+        "id": card_id,
+        "name": name,
+        "desc": "",
+        "idList": list_id,
+        "pos": pos,
+        "closed": False,
+        "idLabels": [],
+        "labels": [],
+        "shortUrl": f"https://trello.com/c/{card_id}",
+    }
+
+
+def make_cache() -> BoardCache:
+    """Builds a cache holding a small board, as if it had just been fetched"""
+    cache = BoardCache(client=None, transport=None, board_id="B0")
+    cache._apply(
+        {
+            "name": "Dave's Corner",
+            "dateLastActivity": "2026-05-05T09:00:00.000Z",
+            "lists": [
+                {"id": "l1", "name": "Todo", "pos": 1, "closed": False},
+                {"id": "l2", "name": "Done", "pos": 2, "closed": False},
+            ],
+            "cards": [
+                card("c1", "Beta", "l1", 1),
+                card("c2", "Gamma", "l1", 2),
+                card("c3", "Epsilon", "l2", 5),
+            ],
+            "labels": [{"id": "b1", "name": "AI", "color": "red"}],
+            "members": [],
+        }
+    )
+    return cache
+
+
+def replay(cache: BoardCache, *names: str):
+    """POSTs recorded payloads to a webhook receiver applying them to the cache"""
+
+    async def run():
+        receiver = WebhookReceiver(
+            cache.apply_action, asyncio.get_running_loop(), port=0
+        )
+        receiver.start()
+        url = f"http://127.0.0.1:{receiver.server.server_port}/"
+        try:
+            for name in names:
+                body = (PAYLOADS / f"{name}.json").read_bytes()
+                request = urllib.request.Request(url, data=body, method="POST")
+                with await asyncio.to_thread(
+                    urllib.request.urlopen, request
+                ) as response:
+                    assert response.status == 200
+                # The receiver schedules the action before answering
+                await asyncio.sleep(0)
+        finally:
+            receiver.stop()
+
+    asyncio.run(run())
+
+
+def names(cache: BoardCache, list_id: str) -> list:
+    return [card["name"] for card in asyncio.run(cache.list_cards(list_id))]
+
+
+def test_moved_card():
+    cache = make_cache()
+    replay(cache, "update_card_moved")
+    assert names(cache, "l1") == ["Gamma"]
+    assert names(cache, "l2") == ["Beta", "Epsilon"]
+    assert not cache.is_stale()
+
+
+def test_archived_card():
+    cache = make_cache()
+    replay(cache, "update_card_archived")
+    assert names(cache, "l1") == ["Beta"]
+    assert cache._archived["c2"]["closed"] is True
+
+
+def test_created_card():
+    cache = make_cache()
+    replay(cache, "create_card")
+    assert names(cache, "l1") == ["Beta", "Gamma", "Delta"]
+
+
+def test_label_added():
+    cache = make_cache()
+    replay(cache, "add_label_to_card")
+    cards = asyncio.run(cache.label_query(all_of=["b1"]))
+    assert [card["name"] for card in cards] == ["Beta"]
+
+
+def test_unknown_card_update_refetches():
+    cache = make_cache()
+    replay(cache, "update_card_renamed_unknown")
+    # The card may be long archived, it is not assumed to be open
+    assert "c9" not in cache._cards
+    assert cache.is_stale()